@@ -0,0 +1,75 @@
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import Config
+from runner import create_modules, run_city
+from setup import setup
+
+log_tag = "[Batch]"
+
+# Modules of the worker process. Created once per worker, so heavy models
+# (spaCy pipeline, VADER analyzer) stay loaded for every city the worker runs.
+worker_modules = None
+
+
+def init_worker(cfg: Config):
+    global worker_modules
+
+    setup(cfg)
+    worker_modules = create_modules(cfg)
+
+
+def run_in_worker(cfg: Config):
+    try:
+        return cfg.city, run_city(cfg, worker_modules), None
+    except Exception:
+        return cfg.city, None, traceback.format_exc()
+
+
+# Runs every configured city on a pool of cfg.workers processes.
+# A failing city is reported in the summary and does not stop the others.
+def run_batch(cfg: Config):
+    print(f"{log_tag}: Running {len(cfg.cities)} cities on {cfg.workers} workers.")
+
+    start = time.perf_counter()
+    results = {}
+
+    with ProcessPoolExecutor(
+        max_workers=cfg.workers, initializer=init_worker, initargs=(cfg,)
+    ) as pool:
+        futures = [pool.submit(run_in_worker, cfg.for_city(city)) for city in cfg.cities]
+
+        for future in as_completed(futures):
+            city, timings, error = future.result()
+            results[city] = (timings, error)
+
+            if error is not None:
+                print(f"{log_tag}: ERROR: '{city}' failed:\n{error}")
+            else:
+                print(f"{log_tag}: '{city}' done in {sum(timings.values()):.1f}s.")
+
+    print_summary(results, time.perf_counter() - start)
+
+    return results
+
+
+def print_summary(results, wall_time: float):
+    print(f"{log_tag}: Summary")
+    print(f"{'city':<30}{'load (s)':>10}{'pipeline (s)':>14}{'total (s)':>11}")
+
+    total = 0.0
+    for city, (timings, error) in sorted(results.items()):
+        if error is not None:
+            print(f"{city:<30}{'failed':>35}")
+            continue
+
+        city_total = sum(timings.values())
+        total += city_total
+        print(f"{city:<30}{timings['load']:>10.1f}{timings['pipeline']:>14.1f}{city_total:>11.1f}")
+
+    failed = sum(1 for _, error in results.values() if error is not None)
+    print(
+        f"{log_tag}: {len(results) - failed} cities done, {failed} failed. "
+        f"Wall time {wall_time:.1f}s, summed city time {total:.1f}s."
+    )
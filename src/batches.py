@@ -0,0 +1,44 @@
+import multiprocessing
+from typing import Callable
+
+from tqdm import tqdm
+
+# Items given to a worker process at a time by map_batches.
+BATCH_SIZE = 5_000
+
+# The function of the process that started the pool, see map_batches.
+worker_function = None
+
+
+# Returns function(batch) for batches of batch_size items, concatenated, running
+# on workers forked processes. The workers are forked after function is set, so
+# whatever it uses (like a loaded model) is there without pickling it, once per
+# worker. function returns a list with a result per item.
+def map_batches(function: Callable[[list], list], items: list, workers: int, desc: str, batch_size: int = BATCH_SIZE) -> list:
+    global worker_function
+
+    batches = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+    progress = dict(desc=desc, total=len(items), unit="reviews")
+
+    results = []
+    if workers <= 1 or len(batches) <= 1:
+        with tqdm(**progress) as bar:
+            for batch in batches:
+                results += function(batch)
+                bar.update(len(batch))
+        return results
+
+    worker_function = function
+    try:
+        with multiprocessing.get_context("fork").Pool(workers) as pool, tqdm(**progress) as bar:
+            for batch in pool.imap(run_in_worker, batches):
+                results += batch
+                bar.update(len(batch))
+    finally:
+        worker_function = None
+
+    return results
+
+
+def run_in_worker(batch: list) -> list:
+    return worker_function(batch)
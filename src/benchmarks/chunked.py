@@ -0,0 +1,83 @@
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cache
+from benchmarks.synthetic import make_reviews
+from config import Config
+from data_loader import Data, PersistentCache
+from pipeline import Pipeline
+from schema import apply_schema
+from setup import setup
+
+# Peak memory and time of running the text stages on the reviews of cities of
+# growing size, all at once and in chunks. Each run is done in its own process,
+# with an empty column cache, so the peak RSS of one does not hide another.
+#
+# Only LanguageDetection, ReviewCleaning and ReviewSentiments run, the spaCy stage
+# is too slow for cities this size.
+#
+# Run from src: python -m benchmarks.chunked [n_reviews ...]
+
+CHUNK_SIZE = 20_000
+
+
+def write_reviews(directory: Path, n_reviews: int):
+    source = PersistentCache("bench", verbose=False)
+    source.cache_directory = directory / "downloaded_data" / "bench"
+
+    reviews = make_reviews(n_reviews, n_listings=n_reviews // 20 + 1)
+    source.write_table(
+        "reviews",
+        (apply_schema("reviews", reviews[i : i + CHUNK_SIZE]) for i in range(0, n_reviews, CHUNK_SIZE)),
+    )
+
+    return source
+
+
+def run(directory: str, n_reviews: int, chunk_size, results):
+    from modules.language_detection import LanguageDetection
+    from modules.review_cleaning import ReviewCleaning
+    from modules.review_sentiments import ReviewSentiments
+
+    cache.CACHE_DIR = str(Path(directory) / f"_cache-{n_reviews}-{chunk_size}")
+    cache.STATS_FILE = str(Path(cache.CACHE_DIR) / "stats.json")
+
+    cfg = Config()
+    setup(cfg)
+
+    source = PersistentCache("bench", verbose=False)
+    source.cache_directory = Path(directory) / "downloaded_data" / "bench"
+    data = Data("bench", source=source)
+
+    start = time.perf_counter()
+    Pipeline([LanguageDetection(), ReviewCleaning(), ReviewSentiments()], chunk_size=chunk_size).run(data)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on linux
+    results.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [50_000, 200_000]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = multiprocessing.Queue()
+
+        for n_reviews in sizes:
+            write_reviews(Path(tmp), n_reviews)
+
+            for name, chunk_size in [("in memory", None), ("chunked", CHUNK_SIZE)]:
+                p = multiprocessing.Process(target=run, args=(tmp, n_reviews, chunk_size, results))
+                p.start()
+                p.join()
+
+                elapsed, peak = results.get()
+                print(f"{n_reviews:>9} reviews, {name:>9}: {elapsed:6.2f} s, peak RSS {peak:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
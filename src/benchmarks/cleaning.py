@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_reviews
+from config import Config
+from setup import setup
+
+# Checks that the batch cleaning of ReviewCleaning gives exactly the reviews
+# clean_review gives, and measures the reviews per second of both. The batch
+# cleaning is measured on one process and on all cores.
+#
+# The reviews are synthetic, with a few made to hit every part of the regexes,
+# or those of a downloaded city if one is given.
+#
+# Run from src: python -m benchmarks.cleaning [n_reviews | city]
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "RT @[User123] check http://example.com/a?b=c now",
+    "rt this",
+    "Great!<br>We stayed<br/>3 nights.<br/><br/>",
+    "Visit https://airbnb.com/rooms/1 or httpx, http",
+    "Tabs\tand\nnewlines\r\nand   spaces",
+    "Ünïcödé façade, café — naïve ☺ 東京",
+    "snake_case words_with_underscores ftp://files x://y",
+    "The the THE and of it's don't I'm",
+    "@[ @[] @[abc123def] email@example.com",
+    "100% 5* 3-night stay, $120/night (incl. fees)",
+]
+
+
+# Random strings of the characters and words the regexes treat specially.
+def random_reviews(n: int) -> list:
+    rng = random.Random(4)
+    parts = ["a", "Z", "9", " ", "\t", "\n", "_", "@", "[", "]", "<br>", "<br/>", "/", ":", "://", "http", "rt", "RT", "é", "☺", "the", "and", "isn't"]
+
+    return ["".join(rng.choices(parts, k=rng.randint(0, 30))) for _ in range(n)]
+
+
+# n synthetic reviews, or the reviews of a downloaded city.
+def sample_reviews(arg: str) -> list:
+    if arg.isdigit():
+        return make_reviews(int(arg), n_listings=100)["comments"].tolist()
+
+    path = os.path.join("..", "downloaded_data", arg, "reviews.parquet")
+    comments = pd.read_parquet(path, columns=["comments"])["comments"]
+
+    return [c for c in comments if isinstance(c, str)]
+
+
+def load_reviews(arg: str) -> list:
+    return EDGE_CASES + random_reviews(10_000) + sample_reviews(arg)
+
+
+def measure(name: str, reviews: list, clean) -> list:
+    start = time.perf_counter()
+    cleaned = clean(reviews)
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>20}: {elapsed:6.2f} s, {len(reviews) / elapsed:10,.0f} reviews/s")
+    return cleaned
+
+
+def main():
+    from modules.review_cleaning import ReviewCleaning
+
+    cfg = Config()
+    setup(cfg)
+
+    reviews = load_reviews(sys.argv[1] if len(sys.argv) > 1 else "200000")
+    cleaner = ReviewCleaning()
+    # At least 2, so the worker processes are checked too.
+    workers = max(2, os.cpu_count() or 1)
+
+    print(f"{len(reviews)} reviews, {os.cpu_count()} cores")
+
+    expected = measure("clean_review", reviews, lambda r: [cleaner.clean_review(x) for x in r])
+    results = {
+        "batch, 1 process": measure("batch, 1 process", reviews, lambda r: cleaner.clean_reviews(r, 1)),
+        f"batch, {workers} processes": measure(f"batch, {workers} processes", reviews, lambda r: cleaner.clean_reviews(r, workers)),
+    }
+
+    for name, cleaned in results.items():
+        different = [i for i, (a, b) in enumerate(zip(expected, cleaned)) if a != b]
+        assert len(cleaned) == len(expected) and not different, f"{name} differs from clean_review for reviews {different[:10]}."
+
+    print("The batch cleaning gives the same reviews as clean_review.")
+
+
+if __name__ == "__main__":
+    main()
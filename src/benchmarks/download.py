@@ -0,0 +1,79 @@
+import gzip
+import io
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import requests
+
+from benchmarks.stand_in_server import StandInServer
+from benchmarks.synthetic import write_city
+from data_loader import DataLoader
+
+# Peak memory and time of downloading the reviews table, before and after
+# streaming the download. Each variant runs in its own process so the peak
+# RSS of one does not hide the other.
+#
+# Run from src: python -m benchmarks.download [n_reviews]
+
+
+def legacy_download(url: str):
+    # The download path as it was: the whole response, then the whole
+    # decompressed file, then the parsed frame.
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        with gzip.open(io.BytesIO(r.content)) as f:
+            text = f.read()
+            return pd.read_csv(io.BytesIO(text))
+
+
+def streamed_download(url: str, cache_dir: str):
+    cfg = SimpleNamespace(verbose=False, city="oslo", data_host="")
+    loader = DataLoader(cfg)
+    loader.cache.cache_directory = Path(cache_dir)
+    loader.download_and_unzip_data("reviews", url, sink=loader.cache)
+
+
+def run(variant: str, url: str, cache_dir: str, results):
+    start = time.perf_counter()
+    if variant == "legacy":
+        legacy_download(url)
+    else:
+        streamed_download(url, cache_dir)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on linux
+    results.put((variant, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    n_reviews = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_city(Path(tmp) / "data" / "oslo", n_listings=100, n_reviews=n_reviews)
+        size = (Path(tmp) / "data" / "oslo" / "reviews.csv.gz").stat().st_size
+
+        print(f"reviews: {n_reviews} rows, {size / 2**20:.1f} MB gzipped")
+
+        with StandInServer(Path(tmp) / "data") as server:
+            url = f"{server.host}/data/oslo/data/reviews.csv.gz"
+            results = multiprocessing.Queue()
+
+            for variant in ["legacy", "streamed"]:
+                p = multiprocessing.Process(
+                    target=run, args=(variant, url, str(Path(tmp) / "cache"), results)
+                )
+                p.start()
+                p.join()
+
+                name, elapsed, peak = results.get()
+                print(f"{name:>10}: {elapsed:6.2f} s, peak RSS {peak:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import sys
+import time
+
+import pandas as pd
+
+import setup
+from benchmarks.cleaning import sample_reviews
+from benchmarks.ner import same_nights
+from config import Config
+
+# Speed and agreement of finding stay lengths with the regex fast path of
+# StayDurations, against running spaCy on every review. The spaCy results are
+# the labels: the agreement is the share of reviews the fast path run gives the
+# same stay length for. The reviews are cleaned first, like in the pipeline.
+#
+# Run from src: python -m benchmarks.durations [n_reviews | city]
+
+
+def measure(name: str, reviews: pd.Series, durations, fast_path: bool) -> list:
+    setup.duration_fast_path = fast_path
+
+    start = time.perf_counter()
+    nights = durations.entities_nights(pd.Series(durations.entities.find(reviews))).tolist()
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>10}: {elapsed:7.2f} s, {len(reviews) / elapsed:8,.0f} reviews/s")
+    return nights
+
+
+def main():
+    from modules.review_cleaning import ReviewCleaning
+    from modules.stay_duration import StayDurations
+
+    cfg = Config()
+    setup.setup(cfg)
+
+    reviews = pd.Series(ReviewCleaning().clean_batch(sample_reviews(sys.argv[1] if len(sys.argv) > 1 else "20000")))
+
+    durations = StayDurations()
+
+    labels = measure("spaCy", reviews, durations, fast_path=False)
+    nights = measure("fast path", reviews, durations, fast_path=True)
+
+    parsed = ~reviews.str.contains("automated", regex=False)
+    decided = pd.Series(durations.entities.fast_entities(reviews[parsed])[0], index=reviews[parsed].index).reindex(reviews.index, fill_value=False)
+    agree = pd.Series([same_nights(a, b) for a, b in zip(labels, nights)])
+
+    print(f"{len(reviews)} reviews, {decided.mean():.1%} decided without spaCy.")
+    print(f"Agreement with spaCy: {agree.mean():.2%} of all reviews, {agree[decided].mean() if decided.any() else 1:.2%} of those decided without spaCy.")
+
+    with_nights = pd.Series([not pd.isna(x) for x in labels])
+    print(f"Reviews spaCy finds a stay length for: {with_nights.sum()}, the fast path agrees on {agree[with_nights].mean() if with_nights.any() else 1:.2%} of them.")
+
+    for i in agree[~agree].index[:10]:
+        print(f"  spaCy {labels[i]}, fast path {nights[i]}: {reviews[i][:100]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.stand_in_server import StandInServer
+from benchmarks.synthetic import write_city
+from data_loader import DataLoader
+
+# Cold-start download time with the three tables fetched one after another
+# and concurrently, from a stand-in server with added latency and a
+# per-connection bandwidth cap.
+#
+# Run from src: python -m benchmarks.fetch [latency_s] [bandwidth_mb_s]
+
+
+def fetch(host: str, cache_dir: Path, workers: int) -> float:
+    cfg = SimpleNamespace(verbose=False, city="oslo", data_host=host)
+    loader = DataLoader(cfg)
+    loader.cache.cache_directory = cache_dir
+    loader.download_workers = workers
+
+    start = time.perf_counter()
+    assert loader.load_from_network() is not None
+    return time.perf_counter() - start
+
+
+def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    bandwidth = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_city(Path(tmp) / "data" / "oslo", n_listings=500, n_reviews=200_000)
+
+        with StandInServer(Path(tmp) / "data", latency, bandwidth * 2**20) as server:
+            sequential = fetch(server.host, Path(tmp) / "sequential", workers=1)
+            concurrent = fetch(server.host, Path(tmp) / "concurrent", workers=3)
+
+    print(f"latency {latency}s, bandwidth {bandwidth} MB/s per connection")
+    print(f"sequential: {sequential:6.2f} s")
+    print(f"concurrent: {concurrent:6.2f} s ({sequential / concurrent:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+import pandas as pd
+
+import setup
+from benchmarks.cleaning import sample_reviews
+from config import Config
+
+# Reviews per second of finding stay durations with the full spaCy pipeline, one
+# review at a time (as StayDurations used to), and with only the entity recognizer
+# on batches of reviews, on one process and on all cores. Checks that all of them
+# find the same nights.
+#
+# Run from src: python -m benchmarks.ner [n_reviews | city]
+
+
+# Stay lengths are None or NaN when not found.
+def same_nights(a, b) -> bool:
+    return (pd.isna(a) and pd.isna(b)) or a == b
+
+
+def measure(name: str, reviews: list, nights) -> list:
+    start = time.perf_counter()
+    found = nights(reviews)
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>28}: {elapsed:7.2f} s, {len(reviews) / elapsed:8,.0f} reviews/s")
+    return found
+
+
+def main():
+    import spacy
+    from modules.stay_duration import SPACY_MODEL, StayDurations, load_model
+
+    cfg = Config()
+    setup.setup(cfg)
+
+    reviews = sample_reviews(sys.argv[1] if len(sys.argv) > 1 else "20000")
+    workers = max(2, os.cpu_count() or 1)
+
+    durations = StayDurations()
+    print(f"{len(reviews)} reviews, {os.cpu_count()} cores")
+
+    durations.entities.nlp = spacy.load(SPACY_MODEL)
+    expected = measure("full pipeline, per review", reviews, lambda r: [durations.get_nights(x) for x in r])
+
+    durations.entities.nlp = load_model()
+    print(f"Enabled components: {durations.entities.nlp.pipe_names}")
+
+    # Every review goes through spaCy.
+    setup.duration_fast_path = False
+
+    results = {}
+    for n in [1, workers]:
+        setup.text_workers = n
+        name = f"entities only, {n} process{'es' if n > 1 else ''}"
+        results[name] = measure(name, reviews, lambda r: durations.entities_nights(pd.Series(durations.entities.find(pd.Series(r)))).tolist())
+
+    for name, found in results.items():
+        different = [i for i, (a, b) in enumerate(zip(expected, found)) if not same_nights(a, b)]
+        assert len(found) == len(expected) and not different, f"{name} differs from the full pipeline for reviews {different[:10]}."
+
+    print("All of them find the same nights.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import setup
+import tokens
+from benchmarks.cleaning import EDGE_CASES, sample_reviews
+from config import Config
+
+# Checks that ReviewSentiments scores reviews exactly like NLTK's VADER
+# (SentimentIntensityAnalyzer.polarity_scores, as float32), and measures the
+# reviews per second of both. ReviewSentiments is measured on one process and on
+# all cores.
+#
+# The reviews are synthetic or those of a downloaded city, both as they are and
+# cleaned like in the pipeline, together with random texts of the words VADER
+# treats specially.
+#
+# Run from src: python -m benchmarks.sentiment [n_reviews | city]
+
+
+def random_texts(n: int, analyzer, context_words) -> list:
+    rng = random.Random(5)
+    words = sorted(analyzer.lexicon)[:: 50] + sorted(context_words) + ["a", "x", "great", "GREAT", "stay", "!", "?", "no", "least", "at"]
+
+    return [" ".join(rng.choices(words, k=rng.randint(0, 20))) for _ in range(n)]
+
+
+def measure(name: str, texts: pd.Series, score) -> pd.DataFrame:
+    start = time.perf_counter()
+    scores = score(texts)
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:>24}: {elapsed:6.2f} s, {len(texts) / elapsed:10,.0f} reviews/s")
+    return scores
+
+
+def main():
+    from modules.review_cleaning import ReviewCleaning
+    from modules.review_sentiments import SCORES, ReviewSentiments
+
+    cfg = Config()
+    setup.setup(cfg)
+
+    sentiments = ReviewSentiments()
+    sentiments.load_analyzer()
+    analyzer = sentiments.analyzer
+
+    reviews = sample_reviews(sys.argv[1] if len(sys.argv) > 1 else "100000")
+    texts = pd.Series(
+        EDGE_CASES
+        + random_texts(20_000, analyzer, sentiments.context_words)
+        + reviews
+        + ReviewCleaning().clean_batch(reviews)
+    )
+
+    # At least 2, so the worker processes are checked too.
+    workers = max(2, os.cpu_count() or 1)
+    simple = sentiments.simple_texts(tokens.tokenize(texts))
+    print(f"{len(texts)} texts, {simple.mean():.1%} scored from the lexicon alone, {os.cpu_count()} cores")
+
+    expected = measure(
+        "polarity_scores",
+        texts,
+        lambda t: pd.DataFrame([analyzer.polarity_scores(x) for x in t])[list(SCORES)].astype(np.float32),
+    )
+
+    for n in [1, workers]:
+        setup.text_workers = n
+        tokens.last_texts = None
+        scores = measure(f"ReviewSentiments, {n} proc.", texts, sentiments.score_texts)
+
+        different = np.flatnonzero((scores.to_numpy() != expected.to_numpy()).any(axis=1))
+        assert not len(different), f"Scores differ from polarity_scores for {len(different)} texts, like {texts[different[:5]].tolist()}."
+
+    print("ReviewSentiments gives the same scores as polarity_scores.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# A local stand-in for insideairbnb.com, so downloads can be run and measured offline.
+#
+# Serves the gateway page '/page-data/<city>/page-data.json' and the files in
+# '<root>/<city>/' under '/data/<city>/data/'. Responses can be delayed by
+# 'latency' seconds and throttled to 'bandwidth' bytes per second.
+
+
+class StandInServer:
+    def __init__(self, root: Path, latency: float = 0.0, bandwidth: float = None):
+        self.root = Path(root)
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stand_in.latency)
+
+                parts = self.path.strip("/").split("/")
+
+                if parts[0] == "page-data" and len(parts) == 3:
+                    city = parts[1]
+                    body = json.dumps(
+                        {
+                            "result": {
+                                "pageContext": {
+                                    "listingsData": f"{stand_in.host}/data/{city}/visualisations/listings.csv.gz"
+                                }
+                            }
+                        }
+                    ).encode()
+                    return self.send(body)
+
+                if parts[0] == "data" and len(parts) == 4:
+                    path = stand_in.root / parts[1] / parts[3]
+                    if path.exists():
+                        return self.send(path.read_bytes())
+
+                self.send_error(404)
+
+            def send(self, body: bytes):
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+
+                block = 64 * 1024
+                for i in range(0, len(body), block):
+                    self.wfile.write(body[i : i + block])
+                    if stand_in.bandwidth:
+                        time.sleep(block / stand_in.bandwidth)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
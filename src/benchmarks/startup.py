@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+# Time from starting Python to having the configured pipeline created, which is
+# all a fully cached run does before it reads its cached results. Each
+# measurement runs in a new interpreter, so nothing is imported yet.
+#
+# "eager" also imports the heavy dependencies and loads the spaCy model up
+# front, like the modules used to at import time.
+#
+# Run from src: python -m benchmarks.startup [runs]
+
+HEAVY_MODULES = ["spacy", "durations_nlp", "nltk", "matplotlib.pyplot"]
+
+STARTUP = """
+import time
+start = time.perf_counter()
+
+from config import Config
+from setup import setup
+from runner import create_modules
+
+cfg = Config()
+setup(cfg)
+{eager}
+create_modules(cfg)
+
+print(time.perf_counter() - start)
+import sys
+print(",".join(m for m in {heavy} if m in sys.modules))
+"""
+
+EAGER = """
+import spacy, durations_nlp, nltk, matplotlib.pyplot
+spacy.load("en_core_web_sm")
+"""
+
+
+def measure(eager: bool):
+    script = STARTUP.format(eager=EAGER if eager else "", heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+
+    return float(out[-2]), out[-1]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    for name, eager in [("lazy", False), ("eager", True)]:
+        results = [measure(eager) for _ in range(runs)]
+        best = min(seconds for seconds, _ in results)
+        print(f"{name:>6}: {best:5.2f} s (best of {runs}), heavy modules imported: {results[0][1] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import gzip
+import random
+from pathlib import Path
+
+import pandas as pd
+
+# Synthetic InsideAirbnb-shaped tables for offline benchmarks.
+
+REVIEW_TEXTS = [
+    "Great stay! We stayed 3 nights and would come back.",
+    "The host canceled this reservation 5 days before arrival. This is an automated posting.",
+    "Lovely apartment close to the city centre, we spent two weeks here.",
+    "Everything was as described. The host was very helpful and responsive.",
+    "Great stay!",
+    "Nice and clean place, a bit noisy at night but overall good value.",
+]
+
+
+def make_listings(n: int) -> pd.DataFrame:
+    rng = random.Random(1)
+    return pd.DataFrame(
+        {
+            "id": range(1, n + 1),
+            "host_response_rate": [f"{rng.randint(0, 100)}%" for _ in range(n)],
+            "host_acceptance_rate": [f"{rng.randint(0, 100)}%" for _ in range(n)],
+            "host_is_superhost": rng.choices("tf", k=n),
+            "neighbourhood_cleansed": rng.choices(["Frogner", "Gamle Oslo", "Grünerløkka"], k=n),
+            "latitude": [59.9 + rng.random() / 10 for _ in range(n)],
+            "longitude": [10.7 + rng.random() / 10 for _ in range(n)],
+            "room_type": rng.choices(["Entire home/apt", "Private room"], k=n),
+            "accommodates": [rng.randint(1, 6) for _ in range(n)],
+            "bedrooms": [rng.randint(1, 4) for _ in range(n)],
+            "beds": [rng.randint(1, 4) for _ in range(n)],
+            "price": [f"${rng.randint(300, 3000):,}.00" for _ in range(n)],
+            "minimum_nights": [rng.randint(1, 30) for _ in range(n)],
+            "first_review": "2018-05-01",
+            "last_review": "2022-08-01",
+            "review_scores_rating": [rng.random() * 5 for _ in range(n)],
+            "review_scores_accuracy": [rng.random() * 5 for _ in range(n)],
+            "review_scores_cleanliness": [rng.random() * 5 for _ in range(n)],
+            "review_scores_checkin": [rng.random() * 5 for _ in range(n)],
+            "review_scores_communication": [rng.random() * 5 for _ in range(n)],
+            "review_scores_location": [rng.random() * 5 for _ in range(n)],
+            "review_scores_value": [rng.random() * 5 for _ in range(n)],
+            "instant_bookable": rng.choices("tf", k=n),
+        }
+    )
+
+
+def make_calendar(n_listings: int, days: int = 365) -> pd.DataFrame:
+    rng = random.Random(2)
+    dates = pd.date_range("2022-09-01", periods=days).strftime("%Y-%m-%d")
+    return pd.DataFrame(
+        {
+            "listing_id": [i for i in range(1, n_listings + 1) for _ in range(days)],
+            "date": list(dates) * n_listings,
+            "available": rng.choices("tf", k=n_listings * days),
+            "price": "$1,100.00",
+            "adjusted_price": "$1,100.00",
+            "minimum_nights": 2,
+            "maximum_nights": 30,
+        }
+    )
+
+
+def make_reviews(n: int, n_listings: int) -> pd.DataFrame:
+    rng = random.Random(3)
+    return pd.DataFrame(
+        {
+            "listing_id": [rng.randint(1, n_listings) for _ in range(n)],
+            "id": range(1, n + 1),
+            "date": [f"2022-0{rng.randint(1, 8)}-1{rng.randint(0, 9)}" for _ in range(n)],
+            "reviewer_id": [rng.randint(1, 10**6) for _ in range(n)],
+            "reviewer_name": "Kari",
+            "comments": rng.choices(REVIEW_TEXTS, k=n),
+        }
+    )
+
+
+# Writes listings.csv.gz, calendar.csv.gz and reviews.csv.gz into directory,
+# named like the files InsideAirbnb publishes.
+def write_city(directory: Path, n_listings: int, n_reviews: int):
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for name, df in [
+        ("listings", make_listings(n_listings)),
+        ("calendar", make_calendar(n_listings)),
+        ("reviews", make_reviews(n_reviews, n_listings)),
+    ]:
+        with gzip.open(directory / f"{name}.csv.gz", "wt", compresslevel=1) as f:
+            df.to_csv(f, index=False)
@@ -0,0 +1,50 @@
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+import setup
+import tokens
+from benchmarks.cleaning import sample_reviews
+from config import Config
+
+# Time and memory of holding the words of the cleaned reviews as a token stream,
+# against splitting them into lists of strings like each text stage used to. The
+# stream is checked to hold the same words.
+#
+# Run from src: python -m benchmarks.tokens [n_reviews | city]
+
+
+def measure(name: str, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{name:>14}: {elapsed:6.2f} s, {size / 2**20:8.1f} MB")
+    return result
+
+
+def main():
+    from modules.review_cleaning import ReviewCleaning
+
+    cfg = Config()
+    setup.setup(cfg)
+
+    texts = pd.Series(ReviewCleaning().clean_batch(sample_reviews(sys.argv[1] if len(sys.argv) > 1 else "100000")))
+
+    words = measure("split", lambda: [text.split() for text in texts])
+    stream = measure("token stream", lambda: tokens.tokenize(texts))
+    measure("stream again", lambda: tokens.tokenize(texts))
+
+    words_of_stream = [stream.vocabulary.words[i] for i in stream.ids]
+    assert words_of_stream == [word for text in words for word in text], "The token stream holds other words than split."
+
+    print(f"{len(texts)} reviews, {len(stream.ids)} words, {len(stream.vocabulary)} distinct.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,386 @@
+import fcntl
+import hashlib
+import inspect
+import json
 import os
 import pickle
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+import profiling
+
+# Relative to src, like the rest of the program's paths.
+CACHE_DIR = "_cache"
+
+# Hit/miss counters per cache key, see record_use.
+STATS_FILE = os.path.join(CACHE_DIR, "stats.json")
+
+# When set, ColumnCache keeps per-row result stores instead of one entry per
+# input, see ColumnCache.get_incremental. Set from the config in setup.
+incremental = False
 
 
 class Cache:
-    def __init__(self, city, key, update_function):
+    # The key is derived from the inputs the cached data is computed from, the code
+    # computing it and its parameters, so a change to any of them is a cache miss.
+    #
+    # inputs: DataFrames/Series the update function reads.
+    # code:   the class or function computing the data. Its source, and its
+    #         "version" attribute if it has one, are part of the key.
+    # params: anything else the result depends on, like model versions.
+    def __init__(self, city, key, update_function, inputs=None, code=None, params=None):
         self.key = f"{key}-{city}".lower()
-        self.cache_dir = "_cache"
+        self.cache_dir = CACHE_DIR
         self.update_function = update_function
 
+        # Statistics are kept per key, not per fingerprinted entry.
+        self.stats_key = self.key
+
+        if inputs is not None or code is not None or params is not None:
+            self.key += "-" + fingerprint(inputs or [], code, params)
+
+    # Entries are written to a temporary file and renamed into place, so an
+    # interrupted run never leaves a partial entry. While one process computes an
+    # entry it holds a lock on it, and other processes wanting the same entry wait
+    # for it instead of computing it again. Entries that fail to load are
+    # recomputed.
     def get(self):
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with profiling.span(f"cache {self.stats_key}", "cache") as args:
+            data, args["hit"] = self.get_data()
+
+        return self.result(data)
+
+    def get_data(self):
+        cache_file = self.path()
+
+        data = self.load(cache_file)
+
+        if data is MISSING:
+            with file_lock(cache_file):
+                # Another process may have computed the entry while we waited for the lock.
+                data = self.load(cache_file)
 
-        cache_file = os.path.join(self.cache_dir, self.key)
+                if data is MISSING:
+                    start = time.perf_counter()
+                    data = self.compute()
+                    atomic_write(cache_file, lambda tmp: self.save(data, tmp))
 
-        if os.path.exists(cache_file):
-            with open(cache_file, "rb") as f:
-                return pickle.load(f)
+                    record_use(self.stats_key, hit=False, seconds=time.perf_counter() - start)
+                    return data, False
 
-        data = self.update_function()
-        pickle.dump(data, open(cache_file, "wb"))
+        # Entries are evicted least recently used first, see cache_manager.
+        os.utime(cache_file)
+        record_use(self.stats_key, hit=True)
 
+        return data, True
+
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, self.key)
+
+    def compute(self):
+        return self.update_function()
+
+    # The cached data as returned by get.
+    def result(self, data):
         return data
+
+    def save(self, data, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(data, f)
+
+    # Returns MISSING if there is no usable entry at path.
+    def load(self, path: str):
+        if not os.path.exists(path):
+            return MISSING
+
+        try:
+            return self.read(path)
+        except Exception as e:
+            print(f"[Cache]: Entry '{path}' is corrupt ({type(e).__name__}: {e}), recomputing.")
+            os.remove(path)
+            return MISSING
+
+    def read(self, path: str):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+# Caches only the columns a stage adds to a table, keyed by the table's row id,
+# instead of the whole table. The cached columns are stored as compressed parquet
+# and joined back onto the table on load.
+#
+# base:    the table the stage runs on.
+# reads:   the columns of base the stage reads, the key is derived from these.
+# writes:  the columns the stage adds or replaces.
+#
+# update_function(base) returns a DataFrame with the writes columns and the index of
+# base. Rows it leaves out are dropped from the table. In incremental mode it is
+# only given the rows that are new or changed since the results were stored.
+class ColumnCache(Cache):
+    def __init__(self, city, key, update_function, base, reads, writes, index="id", code=None, params=None):
+        super().__init__(
+            city,
+            key,
+            update_function,
+            inputs=[base[[index] + reads]],
+            code=code,
+            params=params,
+        )
+        self.base = base
+        self.reads = reads
+        self.writes = writes
+        self.index = index
+
+        # The store of incremental mode outlives the inputs, so it is only keyed on the code and parameters.
+        self.store_key = f"{self.stats_key}-{fingerprint([], code, params)}"
+
+    def get(self):
+        if not incremental:
+            return super().get()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        with profiling.span(f"cache {self.stats_key}", "cache") as args:
+            delta, args["computed_rows"] = self.get_incremental()
+
+        return self.result(delta)
+
+    # Keeps the results of every row computed so far, keyed by the index column and a
+    # hash of the row's reads columns. Only the rows of base that are not in the store,
+    # or whose reads changed, are computed and added to it. As a city's snapshots
+    # repeat all older reviews, a new snapshot only computes its new reviews.
+    #
+    # The store is a directory of parquet parts. Each update adds a part with the rows
+    # it computed, and only the stored rows of base's ids are read, so a city run in
+    # chunks reads and writes the rows of each chunk, not the whole store per chunk.
+    # Rows of the store that are not in base are kept, for later snapshots.
+    def get_incremental(self):
+        directory = os.path.join(self.cache_dir, f"{self.store_key}.store")
+        rows = pd.DataFrame({
+            self.index: self.base[self.index].values,
+            "row_hash": pd.util.hash_pandas_object(self.base[self.reads], index=False).values,
+        })
+
+        with file_lock(directory):
+            os.makedirs(directory, exist_ok=True)
+            store = self.read_store(directory, rows[self.index])
+
+            known = rows.merge(store[[self.index, "row_hash"]], on=[self.index, "row_hash"], how="left", indicator=True)
+            changed = (known["_merge"] == "left_only").values
+
+            if changed.any():
+                start = time.perf_counter()
+                part = self.compute_part(self.base[changed], rows[changed])
+                self.add_part(directory, part)
+
+                store = pd.concat([store[~store[self.index].isin(part[self.index])], part], ignore_index=True)
+                record_use(self.stats_key, hit=False, seconds=time.perf_counter() - start)
+            else:
+                # Entries are evicted least recently used first, see cache_manager.
+                os.utime(directory)
+                record_use(self.stats_key, hit=True)
+
+        current = store[store[self.index].isin(rows[self.index]) & store["kept"]]
+        return current[[self.index] + self.writes], int(changed.sum())
+
+    # The stored rows of ids. A row of a later part replaces that of earlier ones.
+    def read_store(self, directory: str, ids: pd.Series) -> pd.DataFrame:
+        parts = []
+
+        if len(ids):
+            # The range lets parquet skip the parts and row groups of other ids by
+            # their statistics, as the parts are sorted by the index column.
+            filters = [(self.index, ">=", ids.min()), (self.index, "<=", ids.max()), (self.index, "in", ids.tolist())]
+
+            for path in store_parts(directory):
+                try:
+                    parts.append(pd.read_parquet(path, filters=filters))
+                except Exception as e:
+                    print(f"[Cache]: Entry '{path}' is corrupt ({type(e).__name__}: {e}), recomputing.")
+                    os.remove(path)
+
+        if not parts:
+            return pd.DataFrame({self.index: ids.iloc[:0], "row_hash": pd.Series([], dtype="uint64"), "kept": pd.Series([], dtype=bool)})
+
+        return pd.concat(parts, ignore_index=True).drop_duplicates(self.index, keep="last")
+
+    # The rows of the store for changed, a part of base, with their results.
+    def compute_part(self, changed: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+        result = self.update_function(changed)
+
+        kept = changed.index.isin(result.index)
+        hashes = pd.Series(rows["row_hash"].values, index=changed.index)
+
+        computed = result[self.writes].copy()
+        computed.insert(0, self.index, changed.loc[result.index, self.index].values)
+        computed["row_hash"] = hashes.loc[result.index].values
+        computed["kept"] = True
+
+        # Remembered too, so they are not computed again.
+        dropped = rows[~kept].assign(kept=False)
+
+        return pd.concat([computed, dropped], ignore_index=True)
+
+    # Writes part after the parts of the store. Once there are more than
+    # MAX_STORE_PARTS, they are merged into one, so reads do not open ever more files.
+    def add_part(self, directory: str, part: pd.DataFrame):
+        parts = store_parts(directory)
+        number = int(os.path.basename(parts[-1])[5:-8]) + 1 if parts else 0
+
+        if len(parts) >= MAX_STORE_PARTS:
+            merged = pd.concat([pd.read_parquet(path) for path in parts] + [part], ignore_index=True)
+            part = merged.drop_duplicates(self.index, keep="last")
+
+        path = os.path.join(directory, f"part-{number:08d}.parquet")
+        atomic_write(path, lambda tmp: self.save_part(part, tmp))
+
+        # The merged part replaces the others, as it comes after them.
+        if len(parts) >= MAX_STORE_PARTS:
+            for old in parts:
+                os.remove(old)
+
+    def save_part(self, part: pd.DataFrame, path: str):
+        part = part.sort_values(self.index, kind="stable")
+        part.to_parquet(path, compression="zstd", index=False, row_group_size=STORE_ROW_GROUP_SIZE)
+
+    def path(self) -> str:
+        return os.path.join(self.cache_dir, f"{self.key}.parquet")
+
+    def compute(self) -> pd.DataFrame:
+        result = self.update_function(self.base)
+
+        delta = result[self.writes].copy()
+        delta.insert(0, self.index, self.base.loc[result.index, self.index].values)
+        return delta
+
+    def result(self, delta: pd.DataFrame) -> pd.DataFrame:
+        return join_columns(self.base, delta, self.index, self.writes)
+
+    def save(self, delta: pd.DataFrame, path: str):
+        delta.to_parquet(path, compression="zstd", index=False)
+
+    def read(self, path: str) -> pd.DataFrame:
+        return pd.read_parquet(path)
+
+
+# Counts a hit or a miss for key in STATS_FILE. For misses, seconds is the time
+# spent computing (or downloading) the entry.
+def record_use(key: str, hit: bool, seconds: float = 0.0):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    with file_lock(STATS_FILE):
+        stats = read_stats()
+        entry = stats.setdefault(key, {"hits": 0, "misses": 0, "compute_seconds": 0.0})
+
+        entry["hits" if hit else "misses"] += 1
+        entry["compute_seconds"] += seconds
+        entry["last_used"] = time.time()
+
+        atomic_write(STATS_FILE, lambda tmp: write_json(stats, tmp))
+
+
+def read_stats() -> dict:
+    if not os.path.exists(STATS_FILE):
+        return {}
+
+    with open(STATS_FILE, "rt") as f:
+        return json.load(f)
+
+
+def write_json(value, path: str):
+    with open(path, "wt") as f:
+        json.dump(value, f, indent=2)
+
+
+# Marks a cache entry that does not exist or could not be read.
+MISSING = object()
+
+# Parts of an incremental store before they are merged, and the rows per row group
+# of a part, the unit parquet skips rows of other ids in. See ColumnCache.get_incremental.
+MAX_STORE_PARTS = 256
+STORE_ROW_GROUP_SIZE = 50000
+
+
+# The parts of the incremental store in directory, oldest first.
+def store_parts(directory: str):
+    names = sorted(n for n in os.listdir(directory) if n.startswith("part-") and n.endswith(".parquet"))
+    return [os.path.join(directory, n) for n in names]
+
+
+@contextmanager
+def file_lock(path: str):
+    with open(f"{path}.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# Calls write(tmp_path) and moves the written file to path once it is complete.
+def atomic_write(path: str, write):
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Replaces columns of base with those in delta, matching rows on the index column.
+def join_columns(base: pd.DataFrame, delta: pd.DataFrame, index: str, columns) -> pd.DataFrame:
+    values = delta.set_index(index)[columns]
+    base = base.drop(columns=[c for c in columns if c in base.columns])
+
+    return base.join(values, on=index, how="inner")
+
+
+def fingerprint(inputs, code=None, params=None) -> str:
+    h = hashlib.sha256()
+
+    for x in inputs:
+        h.update(frame_hash(x).encode())
+
+    if code is not None:
+        h.update(code_hash(code).encode())
+
+    if params is not None:
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+
+    return h.hexdigest()[:16]
+
+
+# Hashes the index, columns and values of a DataFrame or Series, vectorized per column.
+def frame_hash(x) -> str:
+    h = hashlib.sha256()
+
+    if isinstance(x, pd.Series):
+        x = x.to_frame()
+
+    h.update(json.dumps([str(c) for c in x.columns]).encode())
+    h.update(pd.util.hash_pandas_object(x.index).values.tobytes())
+
+    for col in x.columns:
+        h.update(pd.util.hash_pandas_object(x[col], index=False).values.tobytes())
+
+    return h.hexdigest()
+
+
+code_hashes = {}
+
+
+def code_hash(code) -> str:
+    if code not in code_hashes:
+        source = inspect.getsource(code) + str(getattr(code, "version", ""))
+        code_hashes[code] = hashlib.sha256(source.encode()).hexdigest()
+
+    return code_hashes[code]
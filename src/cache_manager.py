@@ -0,0 +1,149 @@
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from cache import CACHE_DIR, STATS_FILE, read_stats
+from config import Config
+from data_loader import CACHE_ROOT
+
+log_tag = "[CacheManager]"
+
+
+# A stage result in "_cache" or a downloaded city in "downloaded_data".
+class CacheEntry:
+    def __init__(self, path: Path, size: int, last_used: float):
+        self.path = path
+        self.size = size
+        self.last_used = last_used
+
+    # Removes the entry and its lock file (downloaded cities are locked while they
+    # are downloaded, see PersistentCache.lock).
+    def remove(self):
+        if self.path.is_dir():
+            shutil.rmtree(self.path)
+        else:
+            self.path.unlink(missing_ok=True)
+
+        Path(f"{self.path}.lock").unlink(missing_ok=True)
+
+
+# Keeps "_cache" and "downloaded_data" within a size budget.
+#
+# Entries older than max_age_days are removed first, then the least recently used
+# entries until the rest fits in budget_gb. Cache hits touch the entry's mtime, so
+# the mtime is the time of last use.
+class CacheManager:
+    def __init__(self, budget_gb=None, max_age_days=None, verbose=False):
+        self.budget_bytes = None if budget_gb is None else int(budget_gb * 1024**3)
+        self.max_age_seconds = None if max_age_days is None else max_age_days * 24 * 3600
+        self.verbose = verbose
+
+    @staticmethod
+    def from_config(cfg: Config) -> "CacheManager":
+        return CacheManager(cfg.cache_budget_gb, cfg.cache_max_age_days, cfg.verbose)
+
+    def entries(self):
+        entries = []
+
+        if os.path.isdir(CACHE_DIR):
+            for name in os.listdir(CACHE_DIR):
+                path = Path(CACHE_DIR) / name
+
+                # Locks go with their entry, and temporary files belong to running writers.
+                if name.endswith((".lock", ".tmp")) or str(path) == STATS_FILE:
+                    continue
+
+                # Incremental stores are directories of parts, see ColumnCache.get_incremental.
+                entries.append(CacheEntry(path, entry_size(path), path.stat().st_mtime))
+
+        if CACHE_ROOT.is_dir():
+            for path in CACHE_ROOT.iterdir():
+                if not path.is_dir():
+                    continue
+
+                entries.append(CacheEntry(path, entry_size(path), path.stat().st_mtime))
+
+        return entries
+
+    def evict(self):
+        if self.budget_bytes is None and self.max_age_seconds is None:
+            return []
+
+        entries = sorted(self.entries(), key=lambda e: e.last_used)
+        total = sum(e.size for e in entries)
+        now = time.time()
+        evicted = []
+
+        for entry in entries:
+            expired = self.max_age_seconds is not None and now - entry.last_used > self.max_age_seconds
+            over_budget = self.budget_bytes is not None and total > self.budget_bytes
+
+            if not expired and not over_budget:
+                continue
+
+            if self.verbose:
+                print(f"{log_tag}: Evicting {entry.path} ({format_size(entry.size)}).")
+
+            entry.remove()
+            total -= entry.size
+            evicted.append(entry)
+
+        print(
+            f"{log_tag}: Evicted {len(evicted)} entries "
+            f"({format_size(sum(e.size for e in evicted))}), {format_size(total)} in use."
+        )
+
+        return evicted
+
+    def print_stats(self):
+        entries = self.entries()
+        print(f"{log_tag}: {len(entries)} entries, {format_size(sum(e.size for e in entries))} in use.")
+
+        if self.budget_bytes is not None:
+            print(f"{log_tag}: Budget {format_size(self.budget_bytes)}.")
+
+        stats = read_stats()
+        if not stats:
+            print(f"{log_tag}: No cache statistics recorded yet.")
+            return
+
+        print(f"{'key':<40}{'hits':>8}{'misses':>8}{'hit rate':>10}{'compute (s)':>13}  last used")
+        for key, s in sorted(stats.items()):
+            uses = s["hits"] + s["misses"]
+            last_used = datetime.fromtimestamp(s["last_used"]).strftime("%Y-%m-%d %H:%M")
+            print(
+                f"{key:<40}{s['hits']:>8}{s['misses']:>8}{s['hits'] / uses:>10.0%}"
+                f"{s['compute_seconds']:>13.1f}  {last_used}"
+            )
+
+
+def entry_size(path: Path) -> int:
+    if not path.is_dir():
+        return path.stat().st_size
+
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def format_size(size: int) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+
+    return f"{size:.1f} GB"
+
+
+# Usage: python -m cache_manager [stats|evict]
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    assert command in ("stats", "evict"), f"{log_tag}: ERROR: Unknown command '{command}'."
+
+    manager = CacheManager.from_config(Config())
+
+    if command == "evict":
+        manager.evict()
+    else:
+        manager.print_stats()
@@ -0,0 +1,140 @@
+import json
+import os
+import pickle
+import shutil
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from cache import atomic_write, code_hash, write_json
+from config import Config
+from data_loader import url_friendly_city_name
+
+log_tag = "[Checkpoint]"
+
+# Relative to src, like the cache.
+CHECKPOINT_DIR = "_checkpoints"
+
+# Config fields that change how a run is done, but not its results. A checkpoint
+# can be resumed after changing these.
+RUN_OPTIONS = [
+    "verbose",
+    "cities",
+    "workers",
+    "pipeline_workers",
+    "text_workers",
+    "ner_batch_size",
+    "chunk_size",
+    "profile",
+    "profile_stage",
+    "cache_budget_gb",
+    "cache_max_age_days",
+    "checkpoints",
+    "resume",
+    "stages",
+    "plots",
+]
+
+
+# The state of a pipeline run after each finished module: the columns and
+# shared_data keys the module wrote, as parquet and pickle files, and a manifest
+# of the finished modules. A resumed run replays these onto freshly loaded data
+# instead of running the modules again.
+#
+# The manifest records the config, the snapshot of the data and the code of
+# each module. A checkpoint made with another config or data is not resumed,
+# and modules whose code changed (and the modules after them) are run again.
+class Checkpoint:
+    def __init__(self, cfg: Config):
+        # Named like the city's download cache.
+        self.directory = os.path.join(CHECKPOINT_DIR, url_friendly_city_name(cfg.city))
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+
+        config = {k: v for k, v in vars(cfg).items() if k not in RUN_OPTIONS}
+        self.config = json.loads(json.dumps(config, sort_keys=True, default=str))
+
+        self.manifest: Dict[str, Any] = {}
+
+    # Starts a new checkpoint, removing the previous one.
+    def start(self, seed: int, data_version):
+        self.remove()
+        os.makedirs(self.directory)
+
+        self.manifest = {"config": self.config, "data": data_version, "seed": seed, "modules": {}}
+        self.write_manifest()
+
+    # Returns the manifest of the previous run, or None if there is none or it was
+    # made with another config or data.
+    def previous(self, data_version) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            print(f"{log_tag}: No checkpoint to resume from in '{self.directory}'.")
+            return None
+
+        with open(self.manifest_path, "rt") as f:
+            manifest = json.load(f)
+
+        if manifest["config"] != self.config:
+            print(f"{log_tag}: The checkpoint was made with another config, not resuming.")
+            return None
+
+        if manifest["data"] != data_version:
+            print(f"{log_tag}: The checkpoint was made with another data snapshot, not resuming.")
+            return None
+
+        return manifest
+
+    # Continues the previous checkpoint with only the given modules kept.
+    def resume(self, manifest: Dict[str, Any], kept):
+        self.manifest = manifest
+        self.manifest["modules"] = {name: m for name, m in manifest["modules"].items() if name in kept}
+        self.write_manifest()
+
+    def is_saved(self, manifest: Dict[str, Any], module) -> bool:
+        saved = manifest["modules"].get(type(module).__name__)
+        return saved is not None and saved["code"] == code_hash(type(module))
+
+    def save(self, module, tables: Dict[str, pd.DataFrame], shared: Dict[str, Any]):
+        name = type(module).__name__
+
+        for table, df in tables.items():
+            path = self.path(name, f"{table}.parquet")
+            atomic_write(path, lambda tmp: df.to_parquet(tmp, compression="zstd", index=True))
+
+        if shared:
+            atomic_write(self.path(name, "shared_data.pkl"), lambda tmp: write_pickle(shared, tmp))
+
+        # Written last, so a module is only listed once all of its files are complete.
+        self.manifest["modules"][name] = {
+            "code": code_hash(type(module)),
+            "tables": list(tables),
+            "shared_data": bool(shared),
+        }
+        self.write_manifest()
+
+    def load(self, module):
+        name = type(module).__name__
+        saved = self.manifest["modules"][name]
+
+        tables = {t: pd.read_parquet(self.path(name, f"{t}.parquet")) for t in saved["tables"]}
+
+        shared = {}
+        if saved["shared_data"]:
+            with open(self.path(name, "shared_data.pkl"), "rb") as f:
+                shared = pickle.load(f)
+
+        return tables, shared
+
+    def remove(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+    def path(self, module: str, name: str) -> str:
+        return os.path.join(self.directory, f"{module}-{name}")
+
+    def write_manifest(self):
+        atomic_write(self.manifest_path, lambda tmp: write_json(self.manifest, tmp))
+
+
+def write_pickle(value, path: str):
+    with open(path, "wb") as f:
+        pickle.dump(value, f)
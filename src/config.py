@@ -1,3 +1,5 @@
+import copy
+import os
 import yaml
 import json
 
@@ -7,22 +9,126 @@ def assert_type(tag: str, value, want: type) -> bool:
     assert value is not None, f"Required config field '{tag}' is missing."
     assert isinstance(value, want), f"Field '{tag}' must be type '{want}'. Got '{type(value)}'."
 
+def parse_cities(city) -> list:
+    if city == "all":
+        from data_loader import cached_cities
+
+        return cached_cities()
+
+    if isinstance(city, str):
+        return [city]
+
+    assert_type("city", city, list)
+    for c in city:
+        assert_type("city", c, str)
+
+    return city
+
 class Config:
-    def __init__(self, path="../config.yaml"):
+    # cities overrides the "city" field of the file (like main's --city), before the
+    # defaults that depend on the number of cities are worked out.
+    def __init__(self, path="../config.yaml", cities=None):
         print(f"{log_tag}: Loading config.")
 
-        with open("../config.yaml", mode="rt", encoding="utf-8") as file:
+        with open(path, mode="rt", encoding="utf-8") as file:
             cfg = yaml.safe_load(file)
 
             self.verbose = cfg.get("verbose", False)
             assert_type("verbose", self.verbose, bool)
 
-            self.city = cfg.get("city")
-            assert_type("city", self.city, str)
+            # "city" is one city, a list of cities or "all" for every city in the download cache.
+            self.cities = parse_cities(cfg.get("city") if cities is None else cities)
+            assert len(self.cities) > 0, "Field 'city' does not name any cities."
+
+            # The city this config is for, see for_city.
+            self.city = self.cities[0]
+
+            # Number of cities processed in parallel when running more than one.
+            self.workers = cfg.get("workers", min(len(self.cities), os.cpu_count() or 1))
+            assert_type("workers", self.workers, int)
+
+            # Modules of a city that do not depend on each other run on this many processes.
+            self.pipeline_workers = cfg.get("pipeline_workers", 1)
+            assert_type("pipeline_workers", self.pipeline_workers, int)
+
+            # Processes the text stages split their work over. By default the cores are
+            # shared between the cities running at the same time.
+            self.text_workers = cfg.get("text_workers", max(1, (os.cpu_count() or 1) // self.workers))
+            assert_type("text_workers", self.text_workers, int)
+
+            # Reviews spaCy processes at a time when finding stay durations.
+            self.ner_batch_size = cfg.get("ner_batch_size", 1000)
+            assert_type("ner_batch_size", self.ner_batch_size, int)
+
+            # Reads the stay length of reviews that state it plainly (like "3 nights")
+            # with a regex, only running spaCy on the others, see DateEntities.fast_entities.
+            self.duration_fast_path = cfg.get("duration_fast_path", True)
+            assert_type("duration_fast_path", self.duration_fast_path, bool)
+
+            # Detects the language of the reviews, so the stages made for English
+            # (stay durations and sentiments) skip the others, see LanguageDetection.
+            self.language_detection = cfg.get("language_detection", True)
+            assert_type("language_detection", self.language_detection, bool)
+
+            # Keeps stage results per review, so a new snapshot of a city only runs the
+            # text stages on its new and changed reviews.
+            self.incremental = cfg.get("incremental", False)
+            assert_type("incremental", self.incremental, bool)
+
+            # Runs the text stages on this many reviews at a time, keeping only their
+            # numeric results in memory, see Pipeline.run_chunks. Reviews are processed
+            # all at once when not set.
+            self.chunk_size = cfg.get("chunk_size")
+            if self.chunk_size is not None:
+                assert_type("chunk_size", self.chunk_size, int)
+
+            # Saves the state of a city's run after each module to "src/_checkpoints",
+            # so a failed run can be continued with --resume.
+            self.checkpoints = cfg.get("checkpoints", True)
+            assert_type("checkpoints", self.checkpoints, bool)
+
+            # Set from the command line, see main.
+            self.resume = False
+            self.stages = None
+            self.plots = True
+
+            # Writes a report and trace of where the time of each city goes to
+            # "profiles/<city>/". profile_stage also runs that module under cProfile.
+            self.profile = cfg.get("profile", False)
+            assert_type("profile", self.profile, bool)
+
+            self.profile_stage = cfg.get("profile_stage")
+            if self.profile_stage is not None:
+                assert_type("profile_stage", self.profile_stage, str)
+
+            # Size budget for "_cache" and "downloaded_data" together, and the age at which
+            # entries are dropped. Both are unbounded when not set, see cache_manager.
+            self.cache_budget_gb = cfg.get("cache_budget_gb")
+            if self.cache_budget_gb is not None:
+                assert_type("cache_budget_gb", self.cache_budget_gb, (int, float))
+
+            self.cache_max_age_days = cfg.get("cache_max_age_days")
+            if self.cache_max_age_days is not None:
+                assert_type("cache_max_age_days", self.cache_max_age_days, (int, float))
+
+            # Folder the NLTK stopwords and VADER lexicon are read from ("make deps" downloads them).
+            self.nltk_data = cfg.get("nltk_data", "../nltk_data")
+            assert_type("nltk_data", self.nltk_data, str)
+
+            # Where the InsideAirbnb data is downloaded from.
+            self.data_host = cfg.get("data_host", "http://insideairbnb.com")
+            assert_type("data_host", self.data_host, str)
 
         if self.verbose:
             print(f"{log_tag}: Config loaded from '{path}'.")
             print(f"{log_tag}: {self}")
 
+    # A copy of the config for one of the configured cities.
+    def for_city(self, city: str) -> "Config":
+        cfg = copy.copy(self)
+        cfg.city = city
+        cfg.cities = [city]
+        return cfg
+
     def __str__(self):
         return json.dumps(self.__dict__, indent=2)
\ No newline at end of file
@@ -1,16 +1,97 @@
 import requests
 import gzip
-import io
+import os
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+import urllib3
+from urllib3.util.retry import Retry
+
+from cache import atomic_write, file_lock, record_use
+import profiling
+from schema import apply_schema, category_columns
+
+TABLES = ["listings", "calendars", "reviews"]
+
+# Number of csv rows parsed at a time while downloading.
+CHUNK_ROWS = 100_000
+
+# Downloaded tables are cached per city in this directory (relative to src).
+CACHE_ROOT = Path("../downloaded_data")
+
+# Attempts per table download, waiting RETRY_BACKOFF * 2^attempt seconds in between.
+DOWNLOAD_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+
+def table_property(name: str):
+    def get(self):
+        return self.table(name)
+
+    def set(self, value):
+        self.tables[name] = value
+
+    return property(get, set)
 
 
 class Data:
-    def __init__(self, city: str, listings, calendars, reviews):
+    def __init__(self, city: str, listings=None, calendars=None, reviews=None, source=None):
+        self.log_tag = "[Data]"
         self.city = city
-        self.listings = listings
-        self.calendars = calendars
-        self.reviews = reviews
+
+        # Tables that are not given are read from source on first access.
+        self.source = source
+        self.tables = {}
+        self.released = set()
+
+        # Columns to read per table, all columns if a table is not listed.
+        self.columns = {}
+
+        for name, table in zip(TABLES, [listings, calendars, reviews]):
+            if table is not None:
+                self.tables[name] = table
+
+    listings = table_property("listings")
+    calendars = table_property("calendars")
+    reviews = table_property("reviews")
+
+    def table(self, name: str) -> pd.DataFrame:
+        if name not in self.tables:
+            assert name not in self.released, f"{self.log_tag}: ERROR: Table '{name}' was used after it was released."
+            assert self.source is not None, f"{self.log_tag}: ERROR: Table '{name}' is not loaded."
+
+            with profiling.span(f"read {name}", "io"):
+                self.tables[name] = self.source.read_table(name, self.columns.get(name))
+
+        return self.tables[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.tables
+
+    # All columns of a table, including those that are not read.
+    def available_columns(self, name: str) -> list:
+        if self.source is None:
+            return list(self.tables[name].columns) if name in self.tables else []
+
+        return self.source.table_columns(name)
+
+    # Reads a table from the source in chunks, without loading it.
+    def iter_chunks(self, name: str, chunk_rows: int):
+        assert self.source is not None, f"{self.log_tag}: ERROR: Table '{name}' can not be read in chunks."
+
+        yield from self.source.iter_table(name, self.columns.get(name), chunk_rows)
+
+    # Frees a table. If reloadable, it is read again from the source when it is next used.
+    def release(self, name: str, reloadable: bool = False):
+        self.tables.pop(name, None)
+
+        if not reloadable:
+            self.released.add(name)
 
 
 class DataLoader:
@@ -18,6 +99,11 @@ class DataLoader:
         self.log_tag = "[Dataloader]"
         self.verbose = cfg.verbose
         self.city = cfg.city
+        self.data_host = cfg.data_host
+
+        # The three tables are downloaded concurrently over one pooled session.
+        self.download_workers = len(TABLES)
+        self.session = create_session(self.download_workers)
 
         # Cache data locally on disk to avoid network requests.
         self.cache = PersistentCache(self.city, self.verbose)
@@ -29,27 +115,35 @@ class DataLoader:
         data = self.cache.load()
 
         if data is None:
-            data = self.load_from_network()
-            assert data is not None, f"{self.log_tag}: ERROR: Could not load data."
-
-            self.cache.save(data)
-
-        if self.verbose:
-            print(f"{self.log_tag}: Loaded {len(data.listings)} listings")
-            print(f"{self.log_tag}: Loaded {len(data.calendars)} calendar entries")
-            print(f"{self.log_tag}: Loaded {len(data.reviews)} reviews")
-
+            # One process downloads a city at a time, the others wait for it and read
+            # its download.
+            with self.cache.lock():
+                if self.cache.complete():
+                    data = self.cache.load()
+                else:
+                    # Downloads are written straight to the cache and read back from there.
+                    start = time.perf_counter()
+                    data = self.load_from_network()
+                    assert data is not None, f"{self.log_tag}: ERROR: Could not load data."
+
+                    record_use(self.cache.stats_key, hit=False, seconds=time.perf_counter() - start)
+
+                    return data
+
+        # Downloads are evicted least recently used first, see cache_manager.
+        os.utime(self.cache.cache_directory)
+        record_use(self.cache.stats_key, hit=True)
         return data
 
     def load_from_network(self) -> Data or None:
         # the gateway url is a info page that contains the urls to the actual data
-        gateway_url = get_gateway_url_from_city(self.city)
+        gateway_url = get_gateway_url_from_city(self.city, self.data_host)
 
         if self.verbose:
             print(f"{self.log_tag}: Loading from network.")
             print(f"{self.log_tag}: Gateway URL: '{gateway_url}'.")
 
-        page_data_request = requests.get(gateway_url)
+        page_data_request = self.session.get(gateway_url)
 
         if page_data_request.status_code != 200:
             print(f"{self.log_tag}: ERROR: Could not load data from network.")
@@ -72,21 +166,129 @@ class DataLoader:
             print(f"{self.log_tag}: Calendar URL: '{calendar_url}'")
             print(f"{self.log_tag}: Reviews URL: '{reviews_url}'")
 
-        listings_data = self.download_and_unzip_data("listings", listings_url)
-        calendars_data = self.download_and_unzip_data("calendars", calendar_url)
-        reviews_data = self.download_and_unzip_data("reviews", reviews_url)
-
-        return Data(self.city, listings_data, calendars_data, reviews_data)
-
-    def download_and_unzip_data(self, tag: str, url: str):
+        downloads = [
+            ("listings", listings_url),
+            ("calendars", calendar_url),
+            ("reviews", reviews_url),
+        ]
+
+        # Any failed download fails the load, the others are left unfinished in the cache.
+        with ThreadPoolExecutor(self.download_workers) as pool:
+            futures = [
+                pool.submit(self.download_with_retries, tag, url, i)
+                for i, (tag, url) in enumerate(downloads)
+            ]
+
+            for future in futures:
+                future.result()
+
+        return self.cache.load()
+
+    def download_with_retries(self, tag: str, url: str, position: int = 0):
+        for attempt in range(DOWNLOAD_RETRIES):
+            try:
+                return self.download_and_unzip_data(tag, url, self.cache, position)
+            # The response is read through urllib3 directly, so its errors are not wrapped
+            # by requests. A truncated transfer shows up as an EOFError from gzip.
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                urllib3.exceptions.HTTPError,
+                EOFError,
+            ) as e:
+                if attempt == DOWNLOAD_RETRIES - 1:
+                    raise
+
+                wait = RETRY_BACKOFF * 2**attempt
+                print(f"{self.log_tag}: Downloading {tag} failed ({e}), retrying in {wait:.0f}s.")
+                time.sleep(wait)
+
+    # Streams the gzipped csv at url through the decompressor and the csv parser
+    # CHUNK_ROWS rows at a time. The chunks are written to sink if given, otherwise
+    # they are collected and returned as one DataFrame.
+    def download_and_unzip_data(self, tag: str, url: str, sink=None, position: int = 0):
         if self.verbose:
             print(f"{self.log_tag}: Downloading {tag}.")
 
-        with requests.get(url, stream=True) as r:
+        with self.session.get(url, stream=True) as r:
             r.raise_for_status()
-            with gzip.open(io.BytesIO(r.content)) as f:
-                text = f.read()
-                return pd.read_csv(io.BytesIO(text))
+
+            # Undo any transfer encoding, the payload itself is a gzipped csv.
+            r.raw.decode_content = True
+
+            progress = DownloadProgress(
+                r.raw,
+                tag,
+                total=int(r.headers.get("Content-Length", 0)) or None,
+                position=position,
+                disable=not self.verbose,
+            )
+
+            with progress, gzip.GzipFile(fileobj=progress) as f:
+                chunks = (
+                    apply_schema(tag, chunk)
+                    for chunk in pd.read_csv(f, dtype=str, chunksize=CHUNK_ROWS)
+                )
+
+                if sink is not None:
+                    sink.write_table(tag, chunks)
+                    result = None
+                else:
+                    result = pd.concat(chunks, ignore_index=True)
+
+            print(f"{self.log_tag}: {progress.summary()}")
+
+            return result
+
+
+# Counts the bytes read from a response while it is decompressed and parsed.
+class DownloadProgress:
+    def __init__(self, raw, tag: str, total: int, position: int, disable: bool):
+        self.raw = raw
+        self.tag = tag
+        self.bytes_read = 0
+        self.start = time.perf_counter()
+        self.bar = tqdm(
+            total=total,
+            desc=f"Downloading {tag}",
+            unit="B",
+            unit_scale=True,
+            position=position,
+            disable=disable,
+        )
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        self.bar.update(len(data))
+        return data
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.start
+        mb = self.bytes_read / 2**20
+        return f"Downloaded {self.tag}: {mb:.1f} MB in {elapsed:.1f}s ({mb / max(elapsed, 1e-9):.2f} MB/s)."
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.bar.close()
+
+
+# A session whose connection pool fits all concurrent downloads.
+# Connection errors and 5xx responses are retried by urllib3 before a request fails.
+def create_session(pool_size: int) -> requests.Session:
+    retries = Retry(
+        total=DOWNLOAD_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=[500, 502, 503, 504],
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 class PersistentCache:
@@ -94,7 +296,8 @@ class PersistentCache:
         self.log_tag = "[PersistentCache]"
         self.verbose = verbose
         self.city = url_friendly_city_name(city)  # let's not allowed weird folder names
-        self.cache_directory = Path(f"../downloaded_data/{self.city}")
+        self.cache_directory = CACHE_ROOT / self.city
+        self.stats_key = f"download-{self.city}"
 
     def load(self):
         if self.verbose:
@@ -105,25 +308,141 @@ class PersistentCache:
                 print(f"{self.log_tag}: Cache miss.")
             return None
 
-        listings = pd.read_csv(f"{self.cache_directory}/listings.csv")
-        calendars = pd.read_csv(f"{self.cache_directory}/calendars.csv")
-        reviews = pd.read_csv(f"{self.cache_directory}/reviews.csv")
+        # Caches written by older versions are plain csv files.
+        if not self.complete():
+            with self.lock():
+                # Another process may have migrated them while this one waited.
+                if not self.complete():
+                    if not all(self.csv_path(t).exists() for t in TABLES):
+                        if self.verbose:
+                            print(f"{self.log_tag}: Cache miss.")
+                        return None
+
+                    self.migrate_csv()
+
+        # The tables are read when they are first used.
+        return Data(self.city, source=self)
+
+    # Whether every table is in the cache.
+    def complete(self) -> bool:
+        return all(self.table_path(t).exists() for t in TABLES)
+
+    # Held while the city is downloaded or migrated, so processes loading the same
+    # city wait for each other instead of writing the same tables. Not reentrant.
+    def lock(self):
+        self.cache_directory.parent.mkdir(parents=True, exist_ok=True)
+        return file_lock(str(self.cache_directory))
+
+    # Writes a table given as an iterable of DataFrame chunks, one chunk in memory at a time.
+    # Only complete tables end up under the final name, see cache.atomic_write.
+    def write_table(self, table: str, chunks):
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+
+        def write(tmp_path):
+            writer = None
+            try:
+                for chunk in chunks:
+                    if writer is None:
+                        schema = chunk_schema(chunk)
+                        writer = pq.ParquetWriter(tmp_path, schema)
+
+                    writer.write_table(
+                        pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    )
+            finally:
+                if writer is not None:
+                    writer.close()
 
-        return Data(self.city, listings, calendars, reviews)
+            assert writer is not None, f"{self.log_tag}: ERROR: Table '{table}' is empty."
+
+        atomic_write(str(self.table_path(table)), write)
+
+    # Reads a table, or only the given columns of it.
+    def read_table(self, table: str, columns: list = None) -> pd.DataFrame:
+        path = self.table_path(table)
+        names = self.table_columns(table)
+
+        if columns is not None:
+            missing = [c for c in columns if c not in names]
+            assert not missing, f"{self.log_tag}: ERROR: Columns {missing} are used by the pipeline but not in the cached {table} table."
+
+        # Low-cardinality columns are read straight into categoricals.
+        categories = [c for c in category_columns(table) if c in (columns or names)]
+
+        df = pq.read_table(path, columns=columns, read_dictionary=categories).to_pandas()
 
-    def save(self, data: Data):
         if self.verbose:
-            print(f"{self.log_tag}: Caching data in '{self.cache_directory}'.")
+            print(f"{self.log_tag}: Loaded {len(df)} rows and {len(df.columns)} of {len(names)} columns of {table}.")
 
-        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        return df
+
+    # Reads a table in chunks of at most chunk_rows rows. Chunks are indexed by
+    # their rows' positions in the table, like the rows read by read_table.
+    def iter_table(self, table: str, columns: list = None, chunk_rows: int = CHUNK_ROWS):
+        names = self.table_columns(table)
+        categories = [c for c in category_columns(table) if c in (columns or names)]
+
+        start = 0
+        parquet = pq.ParquetFile(self.table_path(table), read_dictionary=categories)
+
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            df = batch.to_pandas()
+            df.index = pd.RangeIndex(start, start + len(df))
+            start += len(df)
+
+            yield df
+
+    # Changes whenever a table is downloaded again.
+    def snapshot_version(self) -> dict:
+        version = {}
+        for table in TABLES:
+            stat = self.table_path(table).stat()
+            version[table] = [stat.st_mtime_ns, stat.st_size]
+
+        return version
+
+    def table_columns(self, table: str) -> list:
+        return pq.read_schema(self.table_path(table)).names
+
+    def migrate_csv(self):
+        print(f"{self.log_tag}: Migrating csv cache in '{self.cache_directory}' to parquet.")
+
+        for table in TABLES:
+            df = apply_schema(table, pd.read_csv(self.csv_path(table), dtype=str))
+            atomic_write(str(self.table_path(table)), lambda tmp_path: df.to_parquet(tmp_path, index=False))
+            del df
+
+            self.csv_path(table).unlink()
+
+    def table_path(self, table: str) -> Path:
+        return self.cache_directory / f"{table}.parquet"
+
+    def csv_path(self, table: str) -> Path:
+        return self.cache_directory / f"{table}.csv"
+
+
+# The parquet schema of a streamed table is fixed by its first chunk.
+# Columns that are empty in that chunk would be typed as null, so they are widened to strings.
+def chunk_schema(chunk: pd.DataFrame) -> pa.Schema:
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+
+    return schema
+
+
+# The cities that have been downloaded before.
+def cached_cities() -> list:
+    if not CACHE_ROOT.exists():
+        return []
 
-        data.listings.to_csv(f"{self.cache_directory}/listings.csv", index=False)
-        data.calendars.to_csv(f"{self.cache_directory}/calendars.csv", index=False)
-        data.reviews.to_csv(f"{self.cache_directory}/reviews.csv", index=False)
+    return sorted(p.name for p in CACHE_ROOT.iterdir() if p.is_dir())
 
 
-def get_gateway_url_from_city(city: str) -> str:
-    return f"http://insideairbnb.com/page-data/{url_friendly_city_name(city)}/page-data.json"
+def get_gateway_url_from_city(city: str, host: str = "http://insideairbnb.com") -> str:
+    return f"{host}/page-data/{url_friendly_city_name(city)}/page-data.json"
 
 
 # There are certain rules for city names on airbnb.
@@ -0,0 +1,48 @@
+from typing import Callable, Optional
+
+import pandas as pd
+
+import profiling
+
+log_tag = "[Dedup]"
+
+# Many reviews are the same text, like the automated posts made when a host
+# cancels a reservation or a plain "Great stay!". The text stages compute their
+# results once per distinct text with apply_unique, and copy them to the rest.
+
+
+# Returns function(unique texts) for every text, in the order and with the index of
+# texts. function is given a Series of the distinct texts and returns a Series or
+# list of results in the same order, or a DataFrame with a row per text.
+#
+# normalise: maps texts to the form function is given them in, for stages whose
+#            results are the same for more texts than the identical ones (like
+#            lowercased texts for a stage that lowercases them first).
+def apply_unique(
+    texts: pd.Series,
+    function: Callable[[pd.Series], object],
+    stage: str,
+    normalise: Optional[Callable[[pd.Series], pd.Series]] = None,
+) -> pd.Series:
+    with profiling.span(f"dedup {stage}", "dedup") as args:
+        keys = normalise(texts) if normalise is not None else texts
+        codes, uniques = pd.factorize(keys)
+        assert (codes >= 0).all(), f"{log_tag}: ERROR: {stage} was given missing texts."
+
+        args["texts"] = len(texts)
+        args["unique"] = len(uniques)
+
+    report(stage, len(texts), len(uniques))
+
+    results = function(pd.Series(uniques, name=texts.name))
+    assert len(results) == len(uniques), f"{log_tag}: ERROR: {stage} returned {len(results)} results for {len(uniques)} texts."
+
+    if isinstance(results, pd.DataFrame):
+        return results.iloc[codes].set_axis(texts.index)
+
+    return pd.Series(pd.Series(results).to_numpy()[codes], index=texts.index, name=texts.name)
+
+
+def report(stage: str, texts: int, unique: int):
+    duplicates = 1 - unique / texts if texts else 0.0
+    print(f"{log_tag}: {stage}: {unique} distinct of {texts} texts, {duplicates:.1%} not computed again.")
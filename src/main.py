@@ -1,37 +1,56 @@
+import argparse
+
 from config import Config
 from setup import setup
-from data_loader import DataLoader
-from pipeline import Pipeline
-import random
+from runner import MODULES, create_modules, run_city
+from batch import run_batch
+from cache_manager import CacheManager
 
-import modules
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyze the InsideAirbnb data of the cities in config.yaml.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the previous run of each city from its last finished module",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        metavar="MODULE",
+        choices=[m.__name__ for m in MODULES],
+        help="only run these modules, and the modules they need the results of",
+    )
+    parser.add_argument(
+        "--no-plots",
+        action="store_true",
+        help="skip all plots",
+    )
+    parser.add_argument(
+        "--city",
+        nargs="+",
+        help="the cities to run, instead of those in config.yaml",
+    )
 
-random.seed(1337)
+    return parser.parse_args()
 
 
 def main():
-    cfg = Config()
-    setup(cfg)
-
-    dl = DataLoader(cfg)
-    data = dl.load()
-
-    pipe = Pipeline(
-        [
-            modules.PrintData(),
-            modules.ReviewCleaning(),
-            modules.StayDurations(),
-            modules.CalculateVacancy(),
-            modules.ReviewSentiments(),
-            modules.StaleListings(),
-            modules.ListingInfoPlots(),
-            # Add modules to run in sequence.
-            # To add a new module just copy the PrintData module and modify the "run" function.
-        ]
-    )
+    args = parse_args()
+
+    cfg = Config(cities=None if args.city is None else args.city if len(args.city) > 1 else args.city[0])
+    cfg.resume = args.resume
+    cfg.stages = args.stages
+    cfg.plots = not args.no_plots
+
+    if len(cfg.cities) > 1:
+        run_batch(cfg)
+    else:
+        setup(cfg)
+        run_city(cfg, create_modules(cfg))
 
-    pipe.run(data)
+    # Only once every city is done, so no entry in use is evicted.
+    CacheManager.from_config(cfg).evict()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,10 @@
 from .print_data import PrintData
+from .language_detection import LanguageDetection
 from .review_cleaning import ReviewCleaning
 from .review_sentiments import ReviewSentiments
+from .sentiment_plots import SentimentPlots
 from .stale_listings import StaleListings
+from .stale_listing_plots import StaleListingPlots
 from .stay_duration import StayDurations
 from .vacancy_calc import CalculateVacancy
 from .listings_plots import ListingInfoPlots
@@ -1,10 +1,51 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Set
 from config import Config
 from data_loader import Data
+import dedup
+
+import pandas as pd
 
 class BaseModule:
+    # The columns the module reads from and writes to each Data table, e.g.
+    # {"reviews": ["listing_id", "comments"]}. An empty list means the module
+    # uses the table without needing any particular column.
+    #
+    # Tables are loaded with only the columns the pipeline reads, on first use,
+    # and released once no later module uses them.
+    reads: Dict[str, List[str]] = {}
+    writes: Dict[str, List[str]] = {}
+
+    # The shared_data keys the module reads and sets.
+    #
+    # Together with reads and writes, these decide which modules depend on each
+    # other, and so which ones the pipeline can run at the same time.
+    consumes: List[str] = []
+    produces: List[str] = []
+
+    # Modules that only make plots are left out when running with --no-plots.
+    # Other modules check plots before making theirs.
+    plot_only = False
+    plots = True
+
     def __init__(self):
         pass
 
+    # Modules that compute columns of the reviews from each review on its own do
+    # that in run_chunk, which returns the reviews with those columns added (and
+    # possibly rows dropped). The pipeline calls it on all reviews right before run,
+    # or in chunked mode on one chunk of reviews at a time before any module runs.
+    # In chunked mode, text columns are only available to run_chunk.
+    chunked = False
+
+    def run_chunk(self, city: str, reviews: pd.DataFrame) -> pd.DataFrame:
+        return reviews
+
     def run(self, data: Data, shared_data: Dict[str, Any]):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    # Computes function once per distinct text, see dedup.apply_unique.
+    def apply_unique(self, texts: pd.Series, function, normalise=None) -> pd.Series:
+        return dedup.apply_unique(texts, function, type(self).__name__, normalise)
+
+    def used_tables(self) -> Set[str]:
+        return set(self.reads) | set(self.writes)
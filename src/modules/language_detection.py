@@ -0,0 +1,134 @@
+from typing import Dict, Any, List
+from .base_module import BaseModule
+from data_loader import Data
+
+from cache import ColumnCache
+import setup
+import tokens
+
+import os
+import numpy as np
+import pandas as pd
+
+# Reviews the language of which is not known: those without enough stopwords of
+# any language, and every review when setup.language_detection is off.
+UNKNOWN = "unknown"
+
+# The languages the English stages (stay durations and sentiments) run on. Reviews
+# of unknown language are taken to be English, as they were before detection.
+ENGLISH = ["english", UNKNOWN]
+
+# Stopwords of a language a review needs to be told apart from English. Reviews
+# with fewer, like "Great place!", are of unknown language.
+MIN_STOPWORDS = 2
+
+
+# The languages of NLTK's stopwords corpus, English first.
+def stopword_languages() -> List[str]:
+    directory = setup.nltk_resource("corpora/stopwords")
+    languages = [name for name in sorted(os.listdir(directory)) if name.islower()]
+
+    return sorted(languages, key=lambda language: language != "english")
+
+
+# Read like nltk.corpus.stopwords.words(language), without importing NLTK.
+def read_stopwords(language: str) -> List[str]:
+    with open(setup.nltk_resource(f"corpora/stopwords/{language}"), "rt", encoding="utf-8") as f:
+        return [w for w in f.read().splitlines() if w.strip()]
+
+
+# The rows of reviews the English stages run on.
+def english_rows(reviews: pd.DataFrame) -> pd.Series:
+    return reviews.language.isin(ENGLISH)
+
+
+# Tells the language of every review from the stopwords of each language of NLTK's
+# stopwords corpus it uses, without any model: the language with the most is that
+# of the review, English on a tie.
+class LanguageDetection(BaseModule):
+    reads = {"reviews": ["id", "comments"]}
+    writes = {"reviews": ["language"]}
+    chunked = True
+
+    def __init__(self):
+        super().__init__()
+
+        self.languages = stopword_languages()
+        assert len(self.languages) < 64, f"Can not detect more than 63 languages, the stopwords corpus has {len(self.languages)}."
+
+        self.stopwords = {language: read_stopwords(language) for language in self.languages}
+        self.stopword_sets = {language: frozenset(words) for language, words in self.stopwords.items()}
+        self.categories = self.languages + [UNKNOWN]
+
+        # The reviews and characters of review text of each language of the city,
+        # added up over its chunks and reported in run.
+        self.counts = pd.DataFrame(0, index=self.categories, columns=["reviews", "characters"])
+
+    def run_chunk(self, city: str, reviews: pd.DataFrame) -> pd.DataFrame:
+        print("Detecting review languages.")
+
+        def generate_data(df):
+            is_text = df.comments.map(lambda x: isinstance(x, str)).to_numpy()
+
+            language = pd.Series(UNKNOWN, index=df.index)
+            if setup.language_detection:
+                language.loc[is_text] = self.apply_unique(df.comments[is_text], self.detect, normalise=lambda texts: texts.str.lower())
+
+            return pd.DataFrame({"language": pd.Categorical(language, categories=self.categories)}, index=df.index)
+
+        reviews = ColumnCache(
+            city,
+            "LanguageDetection",
+            generate_data,
+            base=reviews,
+            reads=["comments"],
+            writes=["language"],
+            code=type(self),
+            params={"stopwords": self.stopwords, "min_stopwords": MIN_STOPWORDS, "enabled": setup.language_detection},
+        ).get()
+
+        # The same categories for every chunk, as the cache may not keep them.
+        reviews["language"] = pd.Categorical(reviews.language, categories=self.categories)
+
+        characters = reviews.comments.map(lambda x: len(x) if isinstance(x, str) else 0)
+        self.counts["reviews"] += reviews.language.value_counts().reindex(self.categories, fill_value=0)
+        self.counts["characters"] += characters.groupby(reviews.language, observed=False).sum().reindex(self.categories, fill_value=0)
+
+        return reviews
+
+    # Reports how much of the city's reviews the English stages skip.
+    def run(self, data: Data, shared_data: Dict[str, Any]):
+        counts = self.counts.copy()
+        self.counts[:] = 0
+
+        # Nothing was counted when the reviews were restored from a checkpoint.
+        if not setup.language_detection or not counts.reviews.sum():
+            return
+
+        shares = counts / counts.sum().replace(0, 1)
+        found = shares[shares.reviews > 0].sort_values("reviews", ascending=False)
+        print(f"Review languages of {data.city}: " + ", ".join(f"{language} {share:.1%}" for language, share in found.reviews.items()))
+
+        skipped = shares.drop(ENGLISH).sum()
+        print(
+            f"The stay durations and sentiments skip {int(counts.drop(ENGLISH).reviews.sum())} reviews that are not in English, "
+            f"{skipped.reviews:.1%} of the reviews and {skipped.characters:.1%} of the review text."
+        )
+
+    # The language of each of texts (lowercased), from the counts of its words in
+    # the stopwords of each language. The languages a word is a stopword of are
+    # looked up once per word, as the bits of a number. The words of every language
+    # are kept in a vocabulary of their own, dropped once the texts are detected,
+    # so the shared one only holds the words the English stages read.
+    def detect(self, texts: pd.Series) -> np.ndarray:
+        stream = tokens.TokenStream.from_texts(texts.str.replace(r"[\W\d_]+", " ", regex=True), tokens.Vocabulary())
+        bits = stream.vocabulary.lookup("stopword languages", self.language_bits, np.int64)[stream.ids]
+
+        hits = np.stack([stream.sum_per_text((bits >> i) & 1) for i in range(len(self.languages))], axis=1)
+        best = hits.argmax(axis=1) if len(hits) else np.zeros(0, dtype=int)
+
+        languages = np.array(self.languages, dtype=object)[best]
+        return np.where(hits.max(axis=1, initial=0) >= MIN_STOPWORDS, languages, UNKNOWN)
+
+    def language_bits(self, word: str) -> int:
+        return sum(1 << i for i, language in enumerate(self.languages) if word in self.stopword_sets[language])
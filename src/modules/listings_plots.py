@@ -2,11 +2,37 @@ from typing import Dict, Any
 from .base_module import BaseModule
 from data_loader import Data
 
-from plotting import plot_path
-import matplotlib.pyplot as plt
+from plotting import plot_path, save_plot
 
 
 class ListingInfoPlots(BaseModule):
+    plot_only = True
+    reads = {
+        "listings": [
+            "host_response_rate",
+            "host_acceptance_rate",
+            "host_is_superhost",
+            "price",
+            "longitude",
+            "latitude",
+            "minimum_nights",
+            "neighbourhood_cleansed",
+            "room_type",
+            "instant_bookable",
+            "accommodates",
+            "bedrooms",
+            "beds",
+            "review_scores_rating",
+            "review_scores_accuracy",
+            "review_scores_cleanliness",
+            "review_scores_checkin",
+            "review_scores_communication",
+            "review_scores_location",
+            "review_scores_value",
+            "vacancy_percent",
+        ],
+    }
+
     # Additional constructor arguments can be added, like config etc.
     def __init__(self):
         super().__init__()
@@ -14,16 +40,14 @@ class ListingInfoPlots(BaseModule):
     # data is the airbnb dataset
     # items in shared_data can be set by any module and will be available to modules later in the pipeline.
     def run(self, data: Data, shared_data: Dict[str, Any]):
+        import matplotlib.pyplot as plt
+
         listings = data.listings.copy()
 
         listings.dropna(
             subset=["host_response_rate", "host_acceptance_rate"], inplace=True
         )
 
-        for col in ["host_response_rate", "host_acceptance_rate"]:
-            listings[col] = listings[col].str.replace("%", "").astype(float)
-
-        listings["price"] = listings["price"].str.replace(r"[$,]", "").astype(float)
         listings["longitude"] = listings["longitude"].astype(float)
         listings["latitude"] = listings["latitude"].astype(float)
         listings["minimum_nights"] = listings["minimum_nights"].astype(float)
@@ -45,105 +69,103 @@ class ListingInfoPlots(BaseModule):
         listings = listings.sort_values(by="vacancy_percent", ascending=False)
 
         # Plot vacancy_percent vs host_response_rate
-        listings.plot.scatter(
+        ax = listings.plot.scatter(
             x="host_response_rate",
             y="vacancy_percent",
             ylabel="vacancy",
             xlabel="host response rate",
             color='#FF5A60',
             figsize=(12, 8),
-        ).get_figure().savefig(
-            plot_path(
-                data.city,
-                "vacancy_vs_host_response_rate",
-            )
         )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_host_response_rate"))
         plt.close()
 
         # Plot vacancy_percent vs host_acceptance_rate
-        listings.plot.scatter(
+        ax = listings.plot.scatter(
             x="host_acceptance_rate",
             y="vacancy_percent",
             ylabel="vacancy",
             xlabel="host acceptance rate",
             color='#FF5A60',
             figsize=(12, 8),
-        ).get_figure().savefig(
-            plot_path(
-                data.city,
-                "vacancy_vs_host_acceptance_rate",
-            )
         )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_host_acceptance_rate"))
         plt.close()
 
         # Plot the vacancy against neighbourhood
-        listings.groupby("neighbourhood_cleansed").vacancy_percent.mean().plot.barh(
+        ax = listings.groupby("neighbourhood_cleansed", observed=True).vacancy_percent.mean().plot.barh(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="neighbourhood",
             ylabel="neighbourhood",
             xlabel="vacancy"
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_neighbourhood"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_neighbourhood"))
         plt.close()
 
         # Plot the vacancy against room_type
-        listings.groupby("room_type").vacancy_percent.mean().plot.barh(
+        ax = listings.groupby("room_type", observed=True).vacancy_percent.mean().plot.barh(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="room type",
             ylabel="room type",
             xlabel="vacancy"
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_room_type"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_room_type"))
         plt.close()
 
         # Plot the vacancy against instant_bookable
-        listings.groupby("instant_bookable").vacancy_percent.mean().plot.bar(
+        ax = listings.groupby("instant_bookable", observed=True).vacancy_percent.mean().plot.bar(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="instant_bookable",
             xlabel="instant bookable",
             ylabel="vacancy"
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_instant_bookable"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_instant_bookable"))
         plt.close()
 
         # Plot the vacancy against accommodates
-        listings.groupby("accommodates").vacancy_percent.mean().plot.bar(
+        ax = listings.groupby("accommodates").vacancy_percent.mean().plot.bar(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="accommodates",
             ylabel="vacancy",
             xlabel="accommodates"
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_accommodates"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_accommodates"))
         plt.close()
 
         # Plot the vacancy against bedrooms
-        listings.groupby("bedrooms").vacancy_percent.mean().plot.bar(
+        ax = listings.groupby("bedrooms").vacancy_percent.mean().plot.bar(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="bedrooms",
             ylabel="vacancy",
             xlabel="bedrooms"
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_bedrooms"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_bedrooms"))
         plt.close()
 
         # Plot the vacancy against beds
-        listings.groupby("beds").vacancy_percent.mean().plot.bar(
+        ax = listings.groupby("beds").vacancy_percent.mean().plot.bar(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="beds",
             ylabel="vacancy",
             xlabel="beds",
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_beds"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_beds"))
         plt.close()
 
         # Plot the vacancy against price
-        listings.plot.scatter(
+        ax = listings.plot.scatter(
             x="price",
             color='#FF5A60',
             y="vacancy_percent",
@@ -151,22 +173,24 @@ class ListingInfoPlots(BaseModule):
             figsize=(12, 8),
             ylabel="vacancy",
             xlabel="price",
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_price"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_price"))
         plt.close()
 
         # Plot the vacancy against host_is_superhost
-        listings.groupby("host_is_superhost").vacancy_percent.mean().plot.bar(
+        ax = listings.groupby("host_is_superhost", observed=True).vacancy_percent.mean().plot.bar(
             figsize=(12, 8),
             color='#FF5A60',
             x="vacancy",
             y="host_is_superhost",
             xlabel="host is superhost",
             ylabel="vacancy",
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_host_is_superhost"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_host_is_superhost"))
         plt.close()
 
         # plot vacancy vs location
-        listings.plot.scatter(
+        ax = listings.plot.scatter(
             x="longitude",
             y="latitude",
             xlabel="longitude",
@@ -175,11 +199,12 @@ class ListingInfoPlots(BaseModule):
             c="vacancy_percent",
             cmap="cool_r",
             figsize=(10, 10),
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_location"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_location"))
         plt.close()
 
         # plot vacancy vs min nights
-        listings.groupby("minimum_nights").vacancy_percent.mean().plot.line(
+        ax = listings.groupby("minimum_nights").vacancy_percent.mean().plot.line(
             x="minimum_nights",
             color='#FF5A60',
             y="vacancy_percent",
@@ -187,7 +212,8 @@ class ListingInfoPlots(BaseModule):
             ylabel="vacancy",
             logx=True,
             figsize=(20, 10),
-        ).get_figure().savefig(plot_path(data.city, "vacancy_vs_minimum_nights"))
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "vacancy_vs_minimum_nights"))
         plt.close()
 
         for col in [
@@ -199,12 +225,13 @@ class ListingInfoPlots(BaseModule):
             "review_scores_location",
             "review_scores_value",
         ]:
-            listings.plot.scatter(
+            ax = listings.plot.scatter(
                 x=col,
                 xlabel=col.replace("_", " "),
                 ylabel="vacancy",
                 y="vacancy_percent",
                 figsize=(15, 10),
                 color='#FF5A60',
-            ).get_figure().savefig(plot_path(data.city, f"vacancy_vs_{col}.svg"))
+            )
+            save_plot(ax.get_figure(), plot_path(data.city, f"vacancy_vs_{col}.svg"))
             plt.close()
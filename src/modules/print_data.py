@@ -3,6 +3,8 @@ from .base_module import BaseModule
 from data_loader import Data
 
 class PrintData(BaseModule):
+    reads = {"listings": [], "calendars": [], "reviews": []}
+
     # Additional constructor arguments can be added, like config etc.
     def __init__(self):
         super().__init__()
@@ -1,195 +1,172 @@
 from typing import Dict, Any
 from .base_module import BaseModule
+from .language_detection import ENGLISH, english_rows
 from data_loader import Data
 
-from cache import Cache
+from batches import map_batches
+from cache import ColumnCache, code_hash
+import setup
+import tokens
 
-from plotting import plot_path
-
-from matplotlib import cm, pyplot as plt
+from importlib.metadata import version
+import re
+import numpy as np
 import pandas as pd
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
 
-nltk.download("vader_lexicon", quiet=True)
+# The VADER scores kept per review, by the names polarity_scores gives them.
+# "sentiment" is the compound score.
+SCORES = {"neg": "sentiment_neg", "neu": "sentiment_neu", "pos": "sentiment_pos", "compound": "sentiment"}
+
+# Words that make VADER change the valence of the words after them, besides its
+# negations and boosters: "but", "least", "never", "so", "this", and a word of each
+# of its multi-word boosters and idioms.
+CONTEXT_WORDS = {
+    "but", "least", "never", "so", "this",
+    "kind", "sort", "enough",
+    "shit", "bomb", "ass", "yeah", "mustard", "kiss", "death", "mouth",
+}
+
+# The code the cached sentiments depend on besides ReviewSentiments, part of their
+# cache key with SCORES, CONTEXT_WORDS and ENGLISH.
+SENTIMENT_CODE = [english_rows, tokens.tokenize, tokens.Vocabulary, tokens.TokenStream]
 
 
 class ReviewSentiments(BaseModule):
+    reads = {"reviews": ["id", "comments", "language"]}
+    writes = {"reviews": list(SCORES.values())}
+    chunked = True
+
     def __init__(self):
         super().__init__()
 
-        self.analyzer = SentimentIntensityAnalyzer()
+        # Loaded when sentiments are computed.
+        self.analyzer = None
+        self.context_words = set()
 
+    # All of the work is done per review, in run_chunk.
     def run(self, data: Data, shared_data: Dict[str, Any]):
-        def generate_data():
-            df = data.reviews
-
-            df["sentiment"] = df.comments.swifter.progress_bar(
-                desc="Calculating review sentiments"
-            ).apply(lambda x: self.analyzer.polarity_scores(x)["compound"])
+        pass
+
+    def run_chunk(self, city: str, reviews: pd.DataFrame) -> pd.DataFrame:
+        # Reviews that are not in English have no sentiment (NaN).
+        def generate_data(df):
+            english = english_rows(df)
+
+            scores = pd.DataFrame(np.nan, index=df.index, columns=list(SCORES.values()), dtype=np.float32)
+            scores.loc[english] = self.apply_unique(df.comments[english], self.score_texts).to_numpy()
+
+            return scores
+
+        return ColumnCache(
+            city,
+            "ReviewSentiments",
+            generate_data,
+            base=reviews,
+            reads=["comments", "language"],
+            writes=list(SCORES.values()),
+            code=type(self),
+            params={
+                "nltk": version("nltk"),
+                "scores": SCORES,
+                "context_words": sorted(CONTEXT_WORDS),
+                "english": ENGLISH,
+                "code": [code_hash(c) for c in SENTIMENT_CODE],
+            },
+        ).get()
+
+    def load_analyzer(self):
+        if self.analyzer is not None:
+            return
+
+        setup.use_nltk()
+        from nltk.sentiment import SentimentIntensityAnalyzer
+        from nltk.sentiment.vader import VaderConstants
 
-            return df
-
-        # Re-assigned to the data.reviews
-        data.reviews = Cache(data.city, "ReviewSentiments", generate_data).get()
-
-        self.plot(data)
-
-    def plot(self, data: Data):
-        reviews = data.reviews.copy()
-        listings = data.listings.copy()
-
-        # Merge and process data
-        avg_sentiments_per_listing = (
-            reviews.groupby("listing_id").sentiment.mean().reset_index()
-        )
-        merged = pd.merge(
-            listings,
-            avg_sentiments_per_listing.rename(columns={"listing_id": "id"}),
-            on="id",
-            how="left",
-        )
-
-        merged["price"] = merged["price"].str.replace(r"[$,]", "").astype(float)
-        merged["longitude"] = merged["longitude"].astype(float)
-        merged["latitude"] = merged["latitude"].astype(float)
-
-        merged = merged[merged["latitude"] < 90]
-        merged = merged[merged["longitude"] < 180]
-        merged = merged.sort_values(by="sentiment", ascending=False)
-
-        merged["minimum_nights"] = merged["minimum_nights"].astype(float)
-
-        # drop rows where host_acceptance_rate is NaN
-        merged = merged[merged["host_acceptance_rate"].notna()]
-        merged["host_acceptance_rate"] = (
-            merged["host_acceptance_rate"].str.replace(r"[%]", "").astype(int)
-        )
-
-        # plot histogram
-        reviews["sentiment"].hist(
-            bins=100,
-            figsize=(10, 5),
-            color='#FF5A60',
-        ).get_figure().savefig(
-            plot_path(data.city, "review_sentiment_distribution")
-        )
-        plt.close()
-
-        # plot sentiment vs price
-        merged.plot.scatter(
-            x="price", y="sentiment", figsize=(10, 10), logx=True, color='#FF5A60',
-            xlabel='price',
-            ylabel='review sentiment',
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_price"))
-        plt.close()
-
-        # plot sentiment vs room type
-        merged.groupby("room_type").sentiment.mean().plot.bar(
-            yerr=merged.groupby("room_type").sentiment.std(), capsize=4, rot=0, color='#FF5A60',
-            xlabel='room type',
-            ylabel='review sentiment',
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_room_type"))
-        plt.close()
-
-        # plot sentiment vs bedrooms
-        merged.groupby("bedrooms").sentiment.mean().plot.bar(
-            yerr=merged.groupby("bedrooms").sentiment.std(), capsize=4, rot=0, color='#FF5A60',
-            xlabel='bedrooms',
-            ylabel='review sentiment',
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_bedrooms"))
-        plt.close()
-
-        # plot sentiment vs beds
-        merged.groupby("beds").sentiment.mean().plot.bar(
-            yerr=merged.groupby("beds").sentiment.std(), capsize=4, rot=0, color='#FF5A60',
-            xlabel='beds',
-            ylabel='review sentiment',
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_beds"))
-        plt.close()
-
-        # plot sentiment vs neighbourhood_cleansed
-        merged.groupby("neighbourhood_cleansed").sentiment.mean().plot.barh(
-            xerr=merged.groupby("neighbourhood_cleansed").sentiment.std(),
-            capsize=4,
-            rot=0,
-            color='#FF5A60',
-            figsize=(12, 8),
-            ylabel='neighbourhood',
-            xlabel='review sentiment',
-        ).get_figure().savefig(
-            plot_path(data.city, "review_sentiment_vs_neighbourhood")
-        )
-        plt.close()
-
-        # plot sentiment vs instant_bookable
-        merged.groupby("instant_bookable").sentiment.mean().plot.bar(
-            yerr=merged.groupby("instant_bookable").sentiment.std(), capsize=4, rot=0, color='#FF5A60',
-            xlabel='instant bookable',
-            ylabel='review sentiment',
-        ).get_figure().savefig(
-            plot_path(data.city, "review_sentiment_vs_instant_bookable")
-        )
-        plt.close()
-
-        # plot sentiment vs accommodates
-        merged.groupby("accommodates").sentiment.mean().plot.bar(
-            yerr=merged.groupby("accommodates").sentiment.std(),
-            capsize=4,
-            rot=0,
-            color='#FF5A60',
-            figsize=(12, 5),
-            xlabel='accommodates',
-            ylabel='review sentiment',
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_accommodates"))
-        plt.close()
-
-        # plot sentiment vs min nights
-        merged.groupby("minimum_nights").sentiment.mean().plot.line(
-            x="minimum nights",
-            y="sentiment",
-            xlabel='minimum nights',
-            ylabel='sentiment',
-            logx=True,
-            color='#FF5A60',
-            figsize=(20, 10),
-        ).get_figure().savefig(
-            plot_path(data.city, "review_sentiment_vs_minimum_nights")
-        )
-        plt.close()
-
-        # plot sentiment vs host acceptance rate
-        merged.groupby("host_acceptance_rate").sentiment.mean().plot.line(
-            x="host acceptance rate",
-            y="sentiment",
-            ylabel='review sentiment',
-            xlabel='host acceptance rate',
-            color='#FF5A60',
-            figsize=(10, 5),
-        ).get_figure().savefig(
-            plot_path(data.city, "review_sentiment_vs_host_acceptance_rate")
+        self.analyzer = SentimentIntensityAnalyzer()
+        self.context_words = CONTEXT_WORDS | set(VaderConstants.NEGATE) | set(VaderConstants.BOOSTER_DICT)
+
+    # The VADER scores of texts (neg, neu, pos and compound, as float32), equal to
+    # those of SentimentIntensityAnalyzer.polarity_scores. Simple texts are scored
+    # by lexicon_scores, the others by VADER on setup.text_workers processes, which
+    # are forked with the lexicon loaded.
+    def score_texts(self, texts: pd.Series) -> pd.DataFrame:
+        self.load_analyzer()
+
+        texts = texts.reset_index(drop=True)
+        stream = tokens.tokenize(texts)
+        simple = self.simple_texts(stream)
+
+        scores = pd.DataFrame(0.0, index=texts.index, columns=list(SCORES))
+        scores.loc[simple] = self.lexicon_scores(stream.take(np.flatnonzero(simple))).to_numpy()
+
+        rest = texts[~simple]
+        if len(rest):
+            results = map_batches(self.score_batch, rest.tolist(), setup.text_workers, desc="Calculating review sentiments")
+            scores.loc[~simple] = pd.DataFrame(results, index=rest.index, columns=list(SCORES))
+
+        return scores.astype(np.float32)
+
+    def score_batch(self, texts: list) -> list:
+        scores = [self.analyzer.polarity_scores(text) for text in texts]
+        return [[s[name] for name in SCORES] for s in scores]
+
+    # Texts VADER scores from the lexicon valence of each word alone: those of
+    # lowercase letters, numbers and whitespace (so no capitals or punctuation
+    # weigh in) without any negations, boosters or other context words.
+    def simple_texts(self, stream: tokens.TokenStream) -> np.ndarray:
+        vocabulary = stream.vocabulary
+        plain = vocabulary.lookup("vader plain", lambda w: re.fullmatch(r"[a-z0-9]+", w) is not None, bool)
+        context = vocabulary.lookup("vader context", lambda w: len(w) > 1 and w in self.context_words, bool)
+
+        return stream.sum_per_text(~plain[stream.ids] | context[stream.ids]) == 0
+
+    # The VADER scores of the simple texts of stream, computed for all of them at
+    # once. The sums are added up word by word, in the order VADER adds them, so the
+    # rounded scores are the same.
+    def lexicon_scores(self, stream: tokens.TokenStream) -> pd.DataFrame:
+        vocabulary = stream.vocabulary
+        lexicon = self.analyzer.lexicon
+
+        # VADER leaves out single characters.
+        words = vocabulary.lookup("vader word", lambda w: len(w) > 1, bool)[stream.ids]
+        valence = vocabulary.lookup("vader valence", lambda w: lexicon.get(w, 0.0), float)[stream.ids][words]
+        text = stream.texts()[words]
+
+        # The position of every word in its text.
+        counts = np.bincount(text, minlength=len(stream))
+        position = np.arange(len(text)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        total = np.zeros(len(stream))
+        pos_sum = np.zeros(len(stream))
+        neg_sum = np.zeros(len(stream))
+        neu_count = np.zeros(len(stream))
+
+        # One word of each text at a time, texts have at most one word at a position.
+        order = np.argsort(position, kind="stable")
+        bounds = np.searchsorted(position[order], np.arange(counts.max() + 1 if len(text) else 1))
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            t = text[order[start:end]]
+            v = valence[order[start:end]]
+
+            total[t] += v
+            pos_sum[t] += np.where(v > 0, v + 1, 0.0)
+            neg_sum[t] += np.where(v < 0, v - 1, 0.0)
+            neu_count[t] += v == 0
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = pos_sum + np.abs(neg_sum) + neu_count
+            scores = {
+                "neg": (np.abs(neg_sum / weight), 3),
+                "neu": (np.abs(neu_count / weight), 3),
+                "pos": (np.abs(pos_sum / weight), 3),
+                "compound": (total / np.sqrt(total * total + 15), 4),
+            }
+
+        # Rounded like VADER rounds them. Texts without words score 0.
+        return pd.DataFrame(
+            {
+                name: [round(x, digits) if n else 0.0 for x, n in zip(values.tolist(), counts)]
+                for name, (values, digits) in scores.items()
+            }
         )
-        plt.close()
-
-        # plot sentiment vs location
-        merged.plot.scatter(
-            x="longitude",
-            y="latitude",
-            s=8,
-            c="sentiment",
-            cmap="cool_r",
-            figsize=(10, 10),
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_location"))
-        plt.close()
-
-        # plot sentiment vs vacancy percent
-        merged.plot.scatter(
-            x="vacancy_percent",
-            y="sentiment",
-            xlabel='vacancy',
-            ylabel='sentiment',
-            color='#FF5A60',
-            figsize=(10, 5),
-            alpha=0.3,
-        ).get_figure().savefig(plot_path(data.city, "review_sentiment_vs_vacancy"))
-        plt.close()
@@ -0,0 +1,196 @@
+from typing import Dict, Any
+from .base_module import BaseModule
+from data_loader import Data
+
+from plotting import plot_path, save_plot
+
+import pandas as pd
+
+
+# Plots the review sentiments from ReviewSentiments against the listing info.
+class SentimentPlots(BaseModule):
+    plot_only = True
+    reads = {
+        "listings": [
+            "id",
+            "price",
+            "longitude",
+            "latitude",
+            "minimum_nights",
+            "host_acceptance_rate",
+            "room_type",
+            "bedrooms",
+            "beds",
+            "neighbourhood_cleansed",
+            "instant_bookable",
+            "accommodates",
+            "vacancy_percent",
+        ],
+        "reviews": ["listing_id", "sentiment"],
+    }
+
+    def __init__(self):
+        super().__init__()
+
+    def run(self, data: Data, shared_data: Dict[str, Any]):
+        self.plot(data)
+
+    def plot(self, data: Data):
+        import matplotlib.pyplot as plt
+
+        reviews = data.reviews.copy()
+        listings = data.listings.copy()
+
+        # Merge and process data
+        avg_sentiments_per_listing = (
+            reviews.groupby("listing_id").sentiment.mean().reset_index()
+        )
+        merged = pd.merge(
+            listings,
+            avg_sentiments_per_listing.rename(columns={"listing_id": "id"}),
+            on="id",
+            how="left",
+        )
+
+        merged["longitude"] = merged["longitude"].astype(float)
+        merged["latitude"] = merged["latitude"].astype(float)
+
+        merged = merged[merged["latitude"] < 90]
+        merged = merged[merged["longitude"] < 180]
+        merged = merged.sort_values(by="sentiment", ascending=False)
+
+        merged["minimum_nights"] = merged["minimum_nights"].astype(float)
+
+        # drop rows where host_acceptance_rate is NaN
+        merged = merged[merged["host_acceptance_rate"].notna()]
+        merged["host_acceptance_rate"] = merged["host_acceptance_rate"].astype(int)
+
+        # plot histogram
+        ax = reviews["sentiment"].hist(
+            bins=100,
+            figsize=(10, 5),
+            color='#FF5A60',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_distribution"))
+        plt.close()
+
+        # plot sentiment vs price
+        ax = merged.plot.scatter(
+            x="price", y="sentiment", figsize=(10, 10), logx=True, color='#FF5A60',
+            xlabel='price',
+            ylabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_price"))
+        plt.close()
+
+        # plot sentiment vs room type
+        ax = merged.groupby("room_type", observed=True).sentiment.mean().plot.bar(
+            yerr=merged.groupby("room_type", observed=True).sentiment.std(), capsize=4, rot=0, color='#FF5A60',
+            xlabel='room type',
+            ylabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_room_type"))
+        plt.close()
+
+        # plot sentiment vs bedrooms
+        ax = merged.groupby("bedrooms").sentiment.mean().plot.bar(
+            yerr=merged.groupby("bedrooms").sentiment.std(), capsize=4, rot=0, color='#FF5A60',
+            xlabel='bedrooms',
+            ylabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_bedrooms"))
+        plt.close()
+
+        # plot sentiment vs beds
+        ax = merged.groupby("beds").sentiment.mean().plot.bar(
+            yerr=merged.groupby("beds").sentiment.std(), capsize=4, rot=0, color='#FF5A60',
+            xlabel='beds',
+            ylabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_beds"))
+        plt.close()
+
+        # plot sentiment vs neighbourhood_cleansed
+        ax = merged.groupby("neighbourhood_cleansed", observed=True).sentiment.mean().plot.barh(
+            xerr=merged.groupby("neighbourhood_cleansed", observed=True).sentiment.std(),
+            capsize=4,
+            rot=0,
+            color='#FF5A60',
+            figsize=(12, 8),
+            ylabel='neighbourhood',
+            xlabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_neighbourhood"))
+        plt.close()
+
+        # plot sentiment vs instant_bookable
+        ax = merged.groupby("instant_bookable", observed=True).sentiment.mean().plot.bar(
+            yerr=merged.groupby("instant_bookable", observed=True).sentiment.std(), capsize=4, rot=0, color='#FF5A60',
+            xlabel='instant bookable',
+            ylabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_instant_bookable"))
+        plt.close()
+
+        # plot sentiment vs accommodates
+        ax = merged.groupby("accommodates").sentiment.mean().plot.bar(
+            yerr=merged.groupby("accommodates").sentiment.std(),
+            capsize=4,
+            rot=0,
+            color='#FF5A60',
+            figsize=(12, 5),
+            xlabel='accommodates',
+            ylabel='review sentiment',
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_accommodates"))
+        plt.close()
+
+        # plot sentiment vs min nights
+        ax = merged.groupby("minimum_nights").sentiment.mean().plot.line(
+            x="minimum nights",
+            y="sentiment",
+            xlabel='minimum nights',
+            ylabel='sentiment',
+            logx=True,
+            color='#FF5A60',
+            figsize=(20, 10),
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_minimum_nights"))
+        plt.close()
+
+        # plot sentiment vs host acceptance rate
+        ax = merged.groupby("host_acceptance_rate").sentiment.mean().plot.line(
+            x="host acceptance rate",
+            y="sentiment",
+            ylabel='review sentiment',
+            xlabel='host acceptance rate',
+            color='#FF5A60',
+            figsize=(10, 5),
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_host_acceptance_rate"))
+        plt.close()
+
+        # plot sentiment vs location
+        ax = merged.plot.scatter(
+            x="longitude",
+            y="latitude",
+            s=8,
+            c="sentiment",
+            cmap="cool_r",
+            figsize=(10, 10),
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_location"))
+        plt.close()
+
+        # plot sentiment vs vacancy percent
+        ax = merged.plot.scatter(
+            x="vacancy_percent",
+            y="sentiment",
+            xlabel='vacancy',
+            ylabel='sentiment',
+            color='#FF5A60',
+            figsize=(10, 5),
+            alpha=0.3,
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "review_sentiment_vs_vacancy"))
+        plt.close()
@@ -0,0 +1,307 @@
+from typing import Any, Dict
+
+from data_loader import Data
+
+from .base_module import BaseModule
+
+from plotting import plot_path, save_plot
+
+
+# Plots the stale listings found by StaleListings against the listing info.
+class StaleListingPlots(BaseModule):
+    plot_only = True
+    reads = {
+        "listings": [
+            "id",
+            "neighbourhood_cleansed",
+            "room_type",
+            "instant_bookable",
+            "accommodates",
+            "bedrooms",
+            "beds",
+            "host_acceptance_rate",
+            "vacancy_percent",
+        ],
+    }
+    consumes = ["stale_listings"]
+
+    def __init__(self):
+        super().__init__()
+
+    def run(self, data: Data, shared_data: Dict[str, Any]):
+        stale = shared_data["stale_listings"]
+
+        self.plot(
+            data,
+            stale["low_future_availability"],
+            stale["no_recent_reviews"],
+            stale["likely_to_cancel"],
+        )
+
+    def plot(
+        self,
+        data: Data,
+        listings_with_low_future_availability,
+        listings_with_no_recent_reviews,
+        listings_likely_to_cancel,
+    ):
+        import matplotlib.pyplot as plt
+
+        df = data.listings.copy()
+
+        # Plot the number of listings per characteristic
+        plt.figure(figsize=(5, 5))
+        plt.pie(
+            [len(listings_with_low_future_availability), len(df)],
+            colors=["#FF5A60", "gray"],
+            labels=("low", "high"),
+            autopct="%1.1f%%"
+        )
+        save_plot(plt.gcf(), plot_path(data.city, "listings_with_low_future_availability"))
+        plt.close()
+        plt.figure(figsize=(5, 5))
+        plt.pie(
+            [len(listings_with_no_recent_reviews), len(df)],
+            colors=["#FF5A60", "gray"],
+            autopct="%1.1f%%",
+            labels=("without reviews", "with reviews")
+        )
+        save_plot(plt.gcf(), plot_path(data.city, "listings_with_no_recent_reviews"))
+        plt.close()
+
+        plt.figure(figsize=(5, 5))
+        plt.pie(
+            [len(listings_likely_to_cancel), len(df)],
+            colors=["#FF5A60", "gray"],
+            autopct="%1.1f%%",
+
+        )
+        save_plot(plt.gcf(), plot_path(data.city, "listings_likely_to_cancel"))
+        plt.close()
+
+        # set 0 or 1 for each listing for each characteristic if exists
+        df["has_low_future_availability"] = 0
+        df.loc[
+            df["id"].isin(listings_with_low_future_availability["id"]),
+            "has_low_future_availability",
+        ] = 1
+
+        df["has_no_recent_reviews"] = 0
+        df.loc[
+            df["id"].isin(listings_with_no_recent_reviews["id"]),
+            "has_no_recent_reviews",
+        ] = 1
+
+        df["is_likely_to_cancel"] = 0
+        df.loc[
+            df["id"].isin(listings_likely_to_cancel["id"]), "is_likely_to_cancel"
+        ] = 1
+
+        # Plot the characteristics against neighbourhood
+        ax = df.groupby(
+            "neighbourhood_cleansed", observed=True
+        ).has_low_future_availability.mean().plot.barh(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings with low future availability',
+            ylabel='neighbourhood'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_neighbourhood"))
+        plt.close()
+        ax = df.groupby("neighbourhood_cleansed", observed=True).has_no_recent_reviews.mean().plot.barh(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings with no recent reviews',
+            ylabel='neighbourhood'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_neighbourhood"))
+        plt.close()
+        ax = df.groupby("neighbourhood_cleansed", observed=True).is_likely_to_cancel.mean().plot.barh(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings likely to cancel',
+            ylabel='neighbourhood'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_neighbourhood"))
+        plt.close()
+
+        # Plot the characteristics against room_type
+        ax = df.groupby("room_type", observed=True).has_low_future_availability.mean().plot.barh(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings with low future availability',
+            ylabel='room type'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_room_type"))
+        plt.close()
+        ax = df.groupby("room_type", observed=True).has_no_recent_reviews.mean().plot.barh(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings with no recent reviews',
+            ylabel='room type'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_room_type"))
+        plt.close()
+        ax = df.groupby("room_type", observed=True).is_likely_to_cancel.mean().plot.barh(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings likely to cancel',
+            ylabel='room type'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_room_type"))
+        plt.close()
+
+        # Plot the characteristics against instant_bookable
+        ax = df.groupby("instant_bookable", observed=True).has_low_future_availability.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with low future availability',
+            xlabel='instant bookable'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_instant_bookable"))
+        plt.close()
+        ax = df.groupby("instant_bookable", observed=True).has_no_recent_reviews.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with no recent reviews',
+            xlabel='instant bookable'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_instant_bookable"))
+        plt.close()
+        ax = df.groupby("instant_bookable", observed=True).is_likely_to_cancel.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings likely to cancel',
+            xlabel='instant bookable'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_instant_bookable"))
+        plt.close()
+
+        # Plot the characteristics against accommodates
+        ax = df.groupby("accommodates").has_low_future_availability.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with low future availability',
+            xlabel='accommodates'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_accommodates"))
+        plt.close()
+        ax = df.groupby("accommodates").has_no_recent_reviews.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings with no recent reviews',
+            ylabel='accommodates'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_accommodates"))
+        plt.close()
+        ax = df.groupby("accommodates").is_likely_to_cancel.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings likely to cancel',
+            ylabel='accommodates'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_accommodates"))
+        plt.close()
+
+        # Plot the characteristics against bedrooms
+        ax = df.groupby("bedrooms").has_low_future_availability.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings with low future availability',
+            ylabel='bedrooms'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_bedrooms"))
+        plt.close()
+        ax = df.groupby("bedrooms").has_no_recent_reviews.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with no recent reviews',
+            xlabel='bedrooms'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_bedrooms"))
+        plt.close()
+        ax = df.groupby("bedrooms").is_likely_to_cancel.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings likely to cancel',
+            ylabel='bedrooms'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_bedrooms"))
+        plt.close()
+
+        # Plot the characteristics against beds
+        ax = df.groupby("beds").has_low_future_availability.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with low future availability',
+            xlabel='beds'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_beds"))
+        plt.close()
+        ax = df.groupby("beds").has_no_recent_reviews.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with no recent reviews',
+            xlabel='beds'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_beds"))
+        plt.close()
+        ax = df.groupby("beds").is_likely_to_cancel.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings likely to cancel',
+            ylabel='beds'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_beds"))
+        plt.close()
+
+        # Plot the characteristics against host_acceptance_rate
+        ax = df.groupby("host_acceptance_rate").has_low_future_availability.mean().plot.line(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with low future availability',
+            xlabel='host acceptance rate'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_host_acceptance_rate"))
+        plt.close()
+        ax = df.groupby("host_acceptance_rate").has_no_recent_reviews.mean().plot.line(
+            figsize=(12, 8),
+            color='#FF5A60',
+            ylabel='listings with no recent reviews',
+            xlabel='host acceptance rate'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_host_acceptance_rate"))
+        plt.close()
+        ax = df.groupby("host_acceptance_rate").is_likely_to_cancel.mean().plot.line(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='listings likely to cancel',
+            ylabel='host acceptance rate'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_host_acceptance_rate"))
+        plt.close()
+
+        # plot vs vacancy percent
+        ax = df.groupby("has_low_future_availability").vacancy_percent.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='low future availability',
+            ylabel='vacancy'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_low_future_availability_vs_vacancy"))
+        plt.close()
+        ax = df.groupby("has_no_recent_reviews").vacancy_percent.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='no recent reviews',
+            ylabel='vacancy'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_with_no_recent_reviews_vs_vacancy"))
+        plt.close()
+        ax = df.groupby("is_likely_to_cancel").vacancy_percent.mean().plot.bar(
+            figsize=(12, 8),
+            color='#FF5A60',
+            xlabel='mean cancellation chance'
+        )
+        save_plot(ax.get_figure(), plot_path(data.city, "listings_likely_to_cancel_vs_vacancy"))
+        plt.close()
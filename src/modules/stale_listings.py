@@ -5,9 +5,6 @@ from data_loader import Data
 
 from .base_module import BaseModule
 
-from plotting import plot_path
-import matplotlib.pyplot as plt
-
 
 # From trello:
 #
@@ -24,9 +21,23 @@ import matplotlib.pyplot as plt
 
 
 class StaleListings(BaseModule):
+    reads = {
+        "listings": ["id"],
+        "calendars": ["listing_id", "date", "available"],
+        "reviews": ["listing_id", "date", "comments"],
+    }
+    writes = {"reviews": ["host_canceled"]}
+    produces = ["stale_listings"]
+    chunked = True
+
     def __init__(self):
         super().__init__()
 
+    # Flags the automated reviews posted when a host cancels a reservation.
+    def run_chunk(self, city: str, reviews: pd.DataFrame) -> pd.DataFrame:
+        reviews["host_canceled"] = reviews["comments"].str.contains("host canceled reservation")
+        return reviews
+
     def run(self, data: Data, shared_data: Dict[str, Any]):
         print("Finding stale listings.")
 
@@ -47,12 +58,12 @@ class StaleListings(BaseModule):
             data.listings, data.reviews, months=24, threshold=0.5
         )
 
-        self.plot(
-            data,
-            listings_with_low_future_availability,
-            listings_with_no_recent_reviews,
-            listings_likely_to_cancel,
-        )
+        # Plotted by StaleListingPlots.
+        shared_data["stale_listings"] = {
+            "low_future_availability": listings_with_low_future_availability,
+            "no_recent_reviews": listings_with_no_recent_reviews,
+            "likely_to_cancel": listings_likely_to_cancel,
+        }
 
     # returns the listings that are not available for threshold % of the next 30 days
     def get_listings_with_low_future_availability(
@@ -62,11 +73,7 @@ class StaleListings(BaseModule):
         months: int,
         threshold: float,
     ) -> pd.DataFrame:
-        # local cleaning
-        calendar["date"] = pd.to_datetime(calendar["date"])
-        calendar["price"] = calendar["price"].str.replace(r"[$,]", "").astype(float)
-        calendar["available"] = calendar["available"].str.lower() == "t"
-
+        # "date" and "available" are typed by the data loader schema.
         max_future_date = calendar["date"].min() + pd.DateOffset(months=months)
 
         future_bookings = calendar[calendar["date"] < max_future_date]
@@ -106,9 +113,7 @@ class StaleListings(BaseModule):
         # Get the number of cancellations for each listing
         num_reviews_per_listing = recent_reviews.groupby("listing_id").size()
         cancellations_per_listing = (
-            recent_reviews[
-                recent_reviews["comments"].str.contains("host canceled reservation")
-            ]
+            recent_reviews[recent_reviews["host_canceled"]]
             .groupby("listing_id")
             .size()
         )
@@ -127,313 +132,3 @@ class StaleListings(BaseModule):
     def get_recent_reviews(self, reviews: pd.DataFrame, months: int) -> pd.DataFrame:
         min_date = reviews["date"].max() - pd.DateOffset(months=months)
         return reviews[reviews["date"] > min_date]
-
-    def plot(
-        self,
-        data: Data,
-        listings_with_low_future_availability,
-        listings_with_no_recent_reviews,
-        listings_likely_to_cancel,
-    ):
-        df = data.listings.copy()
-
-        # Plot the number of listings per characteristic
-        plt.figure(figsize=(5, 5))
-        plt.pie(
-            [len(listings_with_low_future_availability), len(df)],
-            colors=["#FF5A60", "gray"],
-            labels=("low", "high"),
-            autopct="%1.1f%%"
-        )
-        plt.savefig(plot_path(data.city, "listings_with_low_future_availability"))
-        plt.close()
-        plt.figure(figsize=(5, 5))
-        plt.pie(
-            [len(listings_with_no_recent_reviews), len(df)],
-            colors=["#FF5A60", "gray"],
-            autopct="%1.1f%%",
-            labels=("without reviews", "with reviews")
-        )
-        plt.savefig(plot_path(data.city, "listings_with_no_recent_reviews"))
-        plt.close()
-
-        plt.figure(figsize=(5, 5))
-        plt.pie(
-            [len(listings_likely_to_cancel), len(df)],
-            colors=["#FF5A60", "gray"],
-            autopct="%1.1f%%",
-
-        )
-        plt.savefig(plot_path(data.city, "listings_likely_to_cancel"))
-        plt.close()
-
-        # set 0 or 1 for each listing for each characteristic if exists
-        df["has_low_future_availability"] = 0
-        df.loc[
-            df["id"].isin(listings_with_low_future_availability["id"]),
-            "has_low_future_availability",
-        ] = 1
-
-        df["has_no_recent_reviews"] = 0
-        df.loc[
-            df["id"].isin(listings_with_no_recent_reviews["id"]),
-            "has_no_recent_reviews",
-        ] = 1
-
-        df["is_likely_to_cancel"] = 0
-        df.loc[
-            df["id"].isin(listings_likely_to_cancel["id"]), "is_likely_to_cancel"
-        ] = 1
-
-        # Plot the characteristics against neighbourhood
-        df.groupby(
-            "neighbourhood_cleansed"
-        ).has_low_future_availability.mean().plot.barh(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings with low future availability',
-            ylabel='neighbourhood'
-        ).get_figure().savefig(
-            plot_path(
-                data.city, "listings_with_low_future_availability_vs_neighbourhood"
-            )
-        )
-        plt.close()
-        df.groupby("neighbourhood_cleansed").has_no_recent_reviews.mean().plot.barh(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings with no recent reviews',
-            ylabel='neighbourhood'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_no_recent_reviews_vs_neighbourhood")
-        )
-        plt.close()
-        df.groupby("neighbourhood_cleansed").is_likely_to_cancel.mean().plot.barh(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings likely to cancel',
-            ylabel='neighbourhood'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_neighbourhood")
-        )
-        plt.close()
-
-        # Plot the characteristics against room_type
-        df.groupby("room_type").has_low_future_availability.mean().plot.barh(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings with low future availability',
-            ylabel='room type'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_low_future_availability_vs_room_type")
-        )
-        plt.close()
-        df.groupby("room_type").has_no_recent_reviews.mean().plot.barh(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings with no recent reviews',
-            ylabel='room type'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_no_recent_reviews_vs_room_type")
-        )
-        plt.close()
-        df.groupby("room_type").is_likely_to_cancel.mean().plot.barh(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings likely to cancel',
-            ylabel='room type'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_room_type")
-        )
-        plt.close()
-
-        # Plot the characteristics against instant_bookable
-        df.groupby("instant_bookable").has_low_future_availability.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with low future availability',
-            xlabel='instant bookable'
-        ).get_figure().savefig(
-            plot_path(
-                data.city, "listings_with_low_future_availability_vs_instant_bookable"
-            )
-        )
-        plt.close()
-        df.groupby("instant_bookable").has_no_recent_reviews.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with no recent reviews',
-            xlabel='instant bookable'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_no_recent_reviews_vs_instant_bookable")
-        )
-        plt.close()
-        df.groupby("instant_bookable").is_likely_to_cancel.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings likely to cancel',
-            xlabel='instant bookable'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_instant_bookable")
-        )
-        plt.close()
-
-        # Plot the characteristics against accommodates
-        df.groupby("accommodates").has_low_future_availability.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with low future availability',
-            xlabel='accommodates'
-        ).get_figure().savefig(
-            plot_path(
-                data.city, "listings_with_low_future_availability_vs_accommodates"
-            )
-        )
-        plt.close()
-        df.groupby("accommodates").has_no_recent_reviews.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings with no recent reviews',
-            ylabel='accommodates'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_no_recent_reviews_vs_accommodates")
-        )
-        plt.close()
-        df.groupby("accommodates").is_likely_to_cancel.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings likely to cancel',
-            ylabel='accommodates'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_accommodates")
-        )
-        plt.close()
-
-        # Plot the characteristics against bedrooms
-        df.groupby("bedrooms").has_low_future_availability.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings with low future availability',
-            ylabel='bedrooms'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_low_future_availability_vs_bedrooms")
-        )
-        plt.close()
-        df.groupby("bedrooms").has_no_recent_reviews.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with no recent reviews',
-            xlabel='bedrooms'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_no_recent_reviews_vs_bedrooms")
-        )
-        plt.close()
-        df.groupby("bedrooms").is_likely_to_cancel.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings likely to cancel',
-            ylabel='bedrooms'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_bedrooms")
-        )
-        plt.close()
-
-        # Plot the characteristics against beds
-        df.groupby("beds").has_low_future_availability.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with low future availability',
-            xlabel='beds'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_low_future_availability_vs_beds")
-        )
-        plt.close()
-        df.groupby("beds").has_no_recent_reviews.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with no recent reviews',
-            xlabel='beds'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_with_no_recent_reviews_vs_beds")
-        )
-        plt.close()
-        df.groupby("beds").is_likely_to_cancel.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings likely to cancel',
-            ylabel='beds'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_beds")
-        )
-        plt.close()
-
-        # Plot the characteristics against host_acceptance_rate
-        df.groupby("host_acceptance_rate").has_low_future_availability.mean().plot.line(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with low future availability',
-            xlabel='host acceptance rate'
-        ).get_figure().savefig(
-            plot_path(
-                data.city,
-                "listings_with_low_future_availability_vs_host_acceptance_rate",
-            )
-        )
-        plt.close()
-        df.groupby("host_acceptance_rate").has_no_recent_reviews.mean().plot.line(
-            figsize=(12, 8),
-            color='#FF5A60',
-            ylabel='listings with no recent reviews',
-            xlabel='host acceptance rate'
-        ).get_figure().savefig(
-            plot_path(
-                data.city, "listings_with_no_recent_reviews_vs_host_acceptance_rate"
-            )
-        )
-        plt.close()
-        df.groupby("host_acceptance_rate").is_likely_to_cancel.mean().plot.line(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='listings likely to cancel',
-            ylabel='host acceptance rate'
-        ).get_figure().savefig(
-            plot_path(data.city, "listings_likely_to_cancel_vs_host_acceptance_rate")
-        )
-        plt.close()
-
-        # plot vs vacancy percent
-        df.groupby("has_low_future_availability").vacancy_percent.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='low future availability',
-            ylabel='vacancy'
-        ).get_figure().savefig(
-            plot_path(
-                data.city,
-                "listings_with_low_future_availability_vs_vacancy",
-            )
-        )
-        plt.close()
-        df.groupby("has_no_recent_reviews").vacancy_percent.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='no recent reviews',
-            ylabel='vacancy'
-        ).get_figure().savefig(
-            plot_path(
-                data.city,
-                "listings_with_no_recent_reviews_vs_vacancy",
-            )
-        )
-        plt.close()
-        df.groupby("is_likely_to_cancel").vacancy_percent.mean().plot.bar(
-            figsize=(12, 8),
-            color='#FF5A60',
-            xlabel='mean cancellation chance'
-        ).get_figure().savefig(
-            plot_path(
-                data.city,
-                "listings_likely_to_cancel_vs_vacancy",
-            )
-        )
-        plt.close()
@@ -1,23 +1,151 @@
 import random
+import re
 from typing import Dict, Any
 from .base_module import BaseModule
+from .language_detection import english_rows
 from data_loader import Data
 
 import pandas as pd
-from durations_nlp import Duration
-import spacy
 
-import matplotlib.pyplot as plt
-from plotting import plot_path
+from plotting import plot_path, save_plot
 
-from cache import Cache
+from cache import ColumnCache, code_hash
+import setup
+import tokens
+from tqdm import tqdm
+
+from importlib.metadata import version
+
+SPACY_MODEL = "en_core_web_sm"
+
+
+# Loads SPACY_MODEL with only the entity recognizer (and what it is built on)
+# enabled, as only the entities of the reviews are used.
+def load_model():
+    import spacy
+
+    nlp = spacy.load(SPACY_MODEL)
+    needed = {"ner"} | {name for name, pipe in nlp.pipeline if "ner" in getattr(pipe, "listening_components", [])}
+    nlp.select_pipes(enable=[name for name in nlp.pipe_names if name in needed])
+
+    return nlp
+
+
+# Number words the fast path recognizes, like StayDurations.fix_text does.
+NUMBER_WORDS = [
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+    "eighteen", "nineteen", "twenty",
+]
+
+
+# Finds the DATE entities of reviews. These are cached on their own, apart from
+# the stay lengths StayDurations reads from them, so changing how stay lengths
+# are read does not run spaCy again. Only this class and ENTITY_CODE are part of
+# their cache key.
+class DateEntities:
+    def __init__(self):
+        # Loaded when entities are found.
+        self.nlp = None
+
+        # For fast_entities. Numbers are found anywhere in words, like fix_text replaces them.
+        numbers = "|".join(NUMBER_WORDS)
+        self.duration_regex = re.compile(rf"\b((?:\d+|{numbers})\s+(?:days?|nights?|weeks?|months?))\b", re.IGNORECASE)
+        self.number_regex = re.compile(rf"\d+|{numbers}", re.IGNORECASE)
+        self.date_word_regex = re.compile(
+            r"day|night|week|month|year|summer|winter|spring|autumn|fall|christmas|easter|"
+            r"january|february|march|april|may|june|july|august|september|october|november|december",
+            re.IGNORECASE,
+        )
+
+    # The texts of the DATE entities of every text, in order. spaCy runs on batches
+    # of setup.ner_batch_size texts on setup.text_workers processes, and the texts
+    # are streamed through it in order. Automated reviews have no entities.
+    def find(self, texts: pd.Series) -> list:
+        entities = [[] for _ in range(len(texts))]
+        parsed = [i for i, text in enumerate(texts) if "automated" not in text]
+
+        if setup.duration_fast_path:
+            # All of the texts are tokenized, automated ones too, so the later stages
+            # given the same texts reuse their tokens, see tokens.tokenize.
+            tokens.tokenize(texts)
+            decided, fast = self.fast_entities(texts.iloc[parsed])
+
+            for i, is_decided, found in zip(parsed, decided, fast):
+                if is_decided:
+                    entities[i] = found
+
+            parsed = [i for i, is_decided in zip(parsed, decided) if not is_decided]
+
+        if not parsed:
+            return entities
+
+        if self.nlp is None:
+            self.nlp = load_model()
+
+        # Starting the processes takes longer than a single batch.
+        workers = setup.text_workers if len(parsed) > setup.ner_batch_size else 1
+
+        docs = self.nlp.pipe(
+            (texts.iat[i] for i in parsed),
+            batch_size=setup.ner_batch_size,
+            n_process=workers,
+        )
+        progress = tqdm(docs, desc="Finding dates in reviews", total=len(parsed))
+
+        for i, doc in zip(parsed, progress):
+            entities[i] = doc_dates(doc)
+
+        return entities
+
+    # The entities of the texts that can be told without spaCy, as far as stay
+    # lengths are concerned:
+    # - Texts without any number, as text_to_days only finds stay lengths in
+    #   entities with a number. Their entities are left out.
+    # - Texts whose only number and only date word are one duration, like "3 nights"
+    #   or "two weeks", which then has to be the first date entity.
+    # Returns whether each text was decided, and the entities of those that were.
+    #
+    # Numbers and date words do not span whitespace, so they are counted per word
+    # of the vocabulary and added up per text.
+    def fast_entities(self, texts: pd.Series):
+        stream = tokens.tokenize(texts)
+        vocabulary = stream.vocabulary
+
+        numbers = stream.sum_per_text(vocabulary.lookup("date numbers", lambda w: len(self.number_regex.findall(w)), int)[stream.ids])
+        date_words = stream.sum_per_text(vocabulary.lookup("date words", lambda w: len(self.date_word_regex.findall(w)), int)[stream.ids])
+
+        # Only the texts with a single number and date word can be a duration.
+        candidates = (numbers == 1) & (date_words == 1)
+        durations = pd.Series([None] * len(texts), dtype=object)
+        durations[candidates] = texts[candidates].str.extract(self.duration_regex, expand=False).to_numpy()
+
+        direct = candidates & durations.notna().to_numpy()
+        decided = (numbers == 0) | direct
+
+        entities = [[duration] if is_direct else [] for is_direct, duration in zip(direct, durations)]
+
+        return decided.tolist(), entities
+
+
+def doc_dates(doc) -> list:
+    return [ent.text for ent in doc.ents if ent.label_ == "DATE"]
+
+
+# The code the cached entities depend on besides DateEntities, part of their
+# cache key with NUMBER_WORDS.
+ENTITY_CODE = [load_model, doc_dates, tokens.tokenize, tokens.Vocabulary, tokens.TokenStream]
 
 
 class StayDurations(BaseModule):
+    reads = {"reviews": ["id", "comments", "language"]}
+    writes = {"reviews": ["nights", "estimated_nights", "days_occupied"]}
+    chunked = True
+
     def __init__(self):
         super().__init__()
 
-        self.nlp = spacy.load("en_core_web_sm")
+        self.entities = DateEntities()
 
         self.text_to_numbers_dict = {
             "one": "1",
@@ -48,23 +176,50 @@ class StayDurations(BaseModule):
             "nights": "days",
         }
 
-    def run(self, data: Data, shared_data: Dict[str, Any]):
-        def gen_data():
-            df = data.reviews
+        # Stay lengths of the entity texts read so far, see entity_days.
+        self.days_of_entity: Dict[str, Any] = {}
+
+    # The DATE entities of the reviews are cached, and the stay lengths are read
+    # from them on every run. Reviews that are not in English have none.
+    def run_chunk(self, city: str, reviews: pd.DataFrame) -> pd.DataFrame:
+        def gen_entities(df):
+            english = english_rows(df)
 
-            df["nights"] = df.comments.swifter.progress_bar(
-                desc="Calculating nights stayed from reviews"
-            ).apply(lambda x: self.get_nights(x))
+            entities = pd.Series([[] for _ in range(len(df))], index=df.index, dtype=object)
+            entities[english] = self.apply_unique(df.comments[english], self.entities.find)
 
-            return df
+            return entities.to_frame("date_entities")
 
-        # Re-assigned to the data.reviews
-        data.reviews = Cache(data.city, "StayDuration", gen_data).get()
+        reviews = ColumnCache(
+            city,
+            "StayDurationEntities",
+            gen_entities,
+            base=reviews,
+            reads=["comments", "language"],
+            writes=["date_entities"],
+            code=DateEntities,
+            params={
+                "model": SPACY_MODEL,
+                "model_version": version(SPACY_MODEL),
+                "fast_path": setup.duration_fast_path,
+                "number_words": NUMBER_WORDS,
+                "code": [code_hash(c) for c in ENTITY_CODE],
+            },
+        ).get()
 
+        # Reviews without a stay length are NaN.
+        reviews["nights"] = self.entities_nights(reviews.pop("date_entities")).astype(float)
+
+        return reviews
+
+    # The nights of the reviews that do not mention them are sampled from the
+    # distribution over all reviews, so this is done on the whole table.
+    def run(self, data: Data, shared_data: Dict[str, Any]):
         night_distribution = self.get_night_distribution(data.reviews)
 
         # Lets plot for the report
-        self.plot_night_distribution(data.city, night_distribution)
+        if self.plots:
+            self.plot_night_distribution(data.city, night_distribution)
 
         data.reviews["estimated_nights"] = random.choices(
             list(night_distribution.keys()),
@@ -78,17 +233,29 @@ class StayDurations(BaseModule):
 
         # TODO: Visualize the data
 
+    # The stay length of each review from its DATE entities: that of the first one.
+    def entities_nights(self, entities: pd.Series) -> pd.Series:
+        return entities.map(lambda found: self.entity_days(found[0]) if len(found) else None)
+
+    def entity_days(self, text: str):
+        if text not in self.days_of_entity:
+            self.days_of_entity[text] = self.text_to_days(text)
+
+        return self.days_of_entity[text]
+
+    # The stay length of a single review, running the whole pipeline of
+    # self.entities.nlp. Kept as the reference the cached entities are checked
+    # against, see benchmarks/ner.py.
     def get_nights(self, text):
         if "automated" in text:
             return None
 
-        doc = self.nlp(text)
-        for ent in doc.ents:
-            if ent.label_ == "DATE":
-                return self.text_to_days(ent.text)
-        return None
+        dates = doc_dates(self.entities.nlp(text))
+        return self.text_to_days(dates[0]) if dates else None
 
     def text_to_days(self, text: str):
+        from durations_nlp import Duration
+
         if "old" in text:
             # these are mostly "5 months old" sons/daughters
             return None
@@ -131,9 +298,11 @@ class StayDurations(BaseModule):
         return df.nights.groupby(df.nights).count().to_dict()
 
     def plot_night_distribution(self, city: str, probs: Dict[int, float]):
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         ax.bar(probs.keys(), probs.values())
         ax.set_xscale("log")
-        plt.savefig(plot_path(city, "night_distribution.png"))
+        save_plot(fig, plot_path(city, "night_distribution.png"))
         plt.close()
         # where do we can change the color?
@@ -8,6 +8,12 @@ import pandas as pd
 
 
 class CalculateVacancy(BaseModule):
+    reads = {
+        "listings": ["id", "first_review", "last_review"],
+        "reviews": ["listing_id", "days_occupied"],
+    }
+    writes = {"listings": ["vacancy_percent"]}
+
     def __init__(self):
         pass
 
@@ -1,17 +1,396 @@
-from typing import List, Dict, Any
+import multiprocessing
+import random
+import traceback
+from multiprocessing.connection import wait
+from typing import List, Dict, Any, Optional, Set, Tuple
 from config import Config
-from data_loader import Data
+from data_loader import Data, TABLES
+
+import pandas as pd
 
 from modules.base_module import BaseModule
+from checkpoint import Checkpoint
+import profiling
+import tokens
 
 class Pipeline:
-    def __init__(self, modules: List[BaseModule]):
+    # With workers above 1, modules that do not depend on each other run at the
+    # same time, see run_parallel. With a checkpoint, the results of each module
+    # are saved as it finishes, and a resumed run continues from them. With a
+    # chunk_size, the chunked modules process the reviews in chunks of that many rows,
+    # see run_chunks.
+    def __init__(self, modules: List[BaseModule], workers: int = 1, checkpoint: Optional[Checkpoint] = None, chunk_size: Optional[int] = None):
+        self.log_tag = "[Pipeline]"
         self.modules = modules
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
         self.shared_data: Dict[str, Any] = {}
+
+        # Columns of each table that were only kept while processing the chunks.
+        self.spilled: Dict[str, Set[str]] = {}
+        self.chunks_done = False
     
-    def run(self, data: Data):
-        for module in self.modules:
-            module.run(data, self.shared_data)
+    def run(self, data: Data, resume: bool = False):
+        # The token stream vocabulary only holds the words of this city.
+        tokens.reset()
+
+        try:
+            self.run_modules(data, resume)
+        finally:
+            tokens.reset()
+
+    def run_modules(self, data: Data, resume: bool):
+        # Only read the columns the modules declare.
+        data.columns = self.required_columns()
+
+        # Each module gets its own random seed, so its results do not depend on
+        # what ran before it, or at the same time.
+        self.seed = random.getrandbits(32)
+
+        self.spilled = {}
+        self.chunks_done = False
+        if self.chunk_size is not None and any(m.chunked for m in self.modules):
+            self.run_chunks(data)
+
+        done = self.restore(data) if resume and self.checkpoint is not None else set()
+
+        if self.checkpoint is not None and not done:
+            self.checkpoint.start(self.seed, data_version(data))
+
+        if self.workers > 1:
+            self.run_parallel(data, done)
+        else:
+            self.run_sequential(data, done)
+
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
         
         # Cleanup shared data after running all modules.
-        self.shared_data = {}
\ No newline at end of file
+        self.shared_data = {}
+
+    # Replays the saved results of the previous run onto data. Returns the indices of
+    # the modules that do not have to run again: those saved with their current code,
+    # whose dependencies are not run again either.
+    def restore(self, data: Data) -> Set[int]:
+        manifest = self.checkpoint.previous(data_version(data))
+        if manifest is None:
+            return set()
+
+        dependencies = self.dependencies()
+        done: Set[int] = set()
+
+        for i, module in enumerate(self.modules):
+            if self.checkpoint.is_saved(manifest, module) and dependencies[i] <= done:
+                done.add(i)
+
+        self.checkpoint.resume(manifest, {type(self.modules[i]).__name__ for i in done})
+        self.seed = manifest["seed"]
+
+        for i in sorted(done):
+            tables, shared = self.checkpoint.load(self.modules[i])
+            self.merge_results(data, tables, shared, [])
+
+        names = ", ".join(type(self.modules[i]).__name__ for i in sorted(done)) or "none"
+        print(f"{self.log_tag}: Resuming, restored modules: {names}.")
+
+        return done
+
+    # Streams the reviews from the download cache chunk_size rows at a time through
+    # the run_chunk of every chunked module, in pipeline order. The results are
+    # stored in the column cache per chunk, and only the columns that are not text
+    # are kept, so memory grows with the number of reviews times a few numbers
+    # instead of with the length of the reviews. The reviews then hold those
+    # columns when the modules run.
+    def run_chunks(self, data: Data):
+        chunked = [m for m in self.modules if m.chunked]
+
+        # The chunks are read before any module runs, so chunked modules can not read
+        # what other modules write.
+        for module in chunked:
+            earlier = self.modules[: self.modules.index(module)]
+            writers = [type(m).__name__ for m in earlier if not m.chunked and overlaps(module_accesses(m)[1], module_accesses(module)[0])]
+            assert not writers, f"{self.log_tag}: ERROR: Module '{type(module).__name__}' can not run in chunks, it reads what {writers} write."
+
+        print(f"{self.log_tag}: Processing reviews in chunks of {self.chunk_size} rows.")
+
+        results = []
+        with profiling.span("chunks", "chunks") as span_args:
+            for chunk in data.iter_chunks("reviews", self.chunk_size):
+                for module in chunked:
+                    chunk = module.run_chunk(data.city, chunk)
+
+                text = [c for c in chunk.columns if chunk[c].dtype == object]
+                self.spilled.setdefault("reviews", set()).update(text)
+                results.append(chunk.drop(columns=text))
+
+            span_args["chunks"] = len(results)
+
+        data.reviews = pd.concat(results) if results else None
+        self.chunks_done = True
+
+        print(f"{self.log_tag}: Processed {len(results)} chunks, not keeping {sorted(self.spilled.get('reviews', []))} in memory.")
+
+    def save_checkpoint(self, module: BaseModule, tables: Dict[str, Any], shared: Dict[str, Any]):
+        if self.checkpoint is not None:
+            with profiling.span(f"checkpoint {type(module).__name__}", "io"):
+                self.checkpoint.save(module, tables, shared)
+
+    def run_sequential(self, data: Data, done: Set[int]):
+        for i, module in enumerate(self.modules):
+            if i not in done:
+                self.run_module(module, data)
+                self.save_checkpoint(module, *self.module_results(module, data))
+
+            # Free the tables that none of the remaining modules use.
+            # Tables that no module has written to yet (restored ones included) can
+            # be read again later, so those are also freed while the next module
+            # does not need them. Tables built from chunks can not be read again.
+            needed = {t for m in self.modules[i + 1 :] for t in m.used_tables()}
+            written = {t for j, m in enumerate(self.modules) if j <= i or j in done for t in m.writes}
+            written |= set(self.spilled)
+            upcoming = self.modules[i + 1].used_tables() if i + 1 < len(self.modules) else set()
+
+            for table in TABLES:
+                if not data.is_loaded(table):
+                    continue
+
+                if table not in needed:
+                    data.release(table)
+                elif table not in written and table not in upcoming:
+                    data.release(table, reloadable=True)
+
+    # Runs every module in a forked process as soon as the modules it depends on are
+    # done, at most self.workers at a time. The children start from a copy of the
+    # data and send back the columns and shared_data keys they declare writing, which
+    # are merged into the data here. The run takes about as long as the longest
+    # chain of dependent modules, instead of the sum of all of them.
+    def run_parallel(self, data: Data, done: Set[int]):
+        dependencies = self.dependencies()
+        context = multiprocessing.get_context("fork")
+
+        print(f"{self.log_tag}: Running {len(self.modules)} modules on {self.workers} processes.")
+        for i, module in enumerate(self.modules):
+            after = ", ".join(type(self.modules[d]).__name__ for d in sorted(dependencies[i])) or "-"
+            print(f"{self.log_tag}: {type(module).__name__} runs after: {after}")
+
+        pending = [i for i in range(len(self.modules)) if i not in done]
+        running: Dict[Any, Tuple[int, Any]] = {}
+
+        try:
+            while pending or running:
+                ready = [i for i in pending if dependencies[i] <= done]
+
+                for i in ready[: self.workers - len(running)]:
+                    module = self.modules[i]
+                    pending.remove(i)
+
+                    # Loaded here, so the child's results can be merged back into them.
+                    for table in module.used_tables():
+                        data.table(table)
+
+                    receiver, sender = context.Pipe(duplex=False)
+                    process = context.Process(target=self.run_in_child, args=(module, data, sender))
+                    process.start()
+                    sender.close()
+
+                    running[receiver] = (i, process)
+
+                for receiver in wait(list(running)):
+                    i, process = running.pop(receiver)
+                    name = type(self.modules[i]).__name__
+
+                    try:
+                        tables, shared, spans, error = receiver.recv()
+                    except EOFError:
+                        tables, shared, spans, error = None, None, [], "Process exited without a result."
+
+                    process.join()
+                    assert error is None, f"{self.log_tag}: ERROR: Module '{name}' failed:\n{error}"
+
+                    self.merge_results(data, tables, shared, spans)
+                    self.save_checkpoint(self.modules[i], tables, shared)
+                    done.add(i)
+
+                # Free the tables that none of the remaining modules use.
+                needed = {t for i in pending + [i for i, _ in running.values()] for t in self.modules[i].used_tables()}
+                for table in TABLES:
+                    if data.is_loaded(table) and table not in needed:
+                        data.release(table)
+        finally:
+            for _, process in running.values():
+                process.terminate()
+                process.join()
+
+    def run_in_child(self, module: BaseModule, data: Data, sender):
+        # The child starts with a copy of the parent's spans, only its own are sent back.
+        first_span = len(profiling.recorded())
+
+        try:
+            self.run_module(module, data)
+            tables, shared = self.module_results(module, data)
+
+            sender.send((tables, shared, profiling.recorded()[first_span:], None))
+        except BaseException:
+            sender.send((None, None, [], traceback.format_exc()))
+        finally:
+            sender.close()
+
+    # The columns and shared_data keys a module declares writing, except those that
+    # were only kept while processing the chunks.
+    def module_results(self, module: BaseModule, data: Data):
+        tables = {
+            t: data.table(t)[[c for c in columns if c not in self.spilled.get(t, set())]]
+            for t, columns in module.writes.items()
+        }
+        shared = {key: self.shared_data[key] for key in module.produces}
+
+        return tables, shared
+
+    def merge_results(self, data: Data, tables: Dict[str, Any], shared: Dict[str, Any], spans: list):
+        for table, written in tables.items():
+            current = data.table(table)
+
+            # Rows the module dropped (like reviews without text) are dropped here too.
+            if not current.index.equals(written.index):
+                current = current.loc[written.index]
+            else:
+                current = current.copy()
+
+            for col in written.columns:
+                current[col] = written[col]
+
+            setattr(data, table, current)
+
+        self.shared_data.update(shared)
+        profiling.add(spans)
+
+    # For each module, the earlier modules it has to run after: those that write
+    # something it reads or writes, and those that read something it writes.
+    # Reading a table without naming columns counts as reading all of it.
+    def dependencies(self) -> List[Set[int]]:
+        accesses = [module_accesses(m) for m in self.modules]
+        dependencies = []
+
+        for j, (reads, writes) in enumerate(accesses):
+            dependencies.append({
+                i
+                for i, (earlier_reads, earlier_writes) in enumerate(accesses[:j])
+                if overlaps(earlier_writes, reads | writes) or overlaps(earlier_reads, writes)
+            })
+
+        return dependencies
+
+    # The columns that have to be read from each table: every column a module reads
+    # that is not written by a module before it. Tables that are used without naming
+    # any columns are read in full.
+    def required_columns(self) -> Dict[str, List[str]]:
+        required: Dict[str, List[str]] = {}
+        written: Dict[str, Set[str]] = {}
+        used: Set[str] = set()
+
+        for module in self.modules:
+            for table, columns in module.reads.items():
+                used.add(table)
+                for col in columns:
+                    if col not in written.get(table, set()) and col not in required.get(table, []):
+                        required.setdefault(table, []).append(col)
+
+            for table, columns in module.writes.items():
+                written.setdefault(table, set()).update(columns)
+
+        return {t: cols for t, cols in required.items() if t in used}
+
+    # Runs a module and checks that it only touched the columns it declares.
+    def run_module(self, module: BaseModule, data: Data):
+        name = type(module).__name__
+        random.seed(f"{self.seed}-{name}")
+
+        before = {t: set(data.table(t).columns) for t in TABLES if data.is_loaded(t)}
+
+        try:
+            with profiling.span(name, "module") as span_args, profiling.cprofile(name):
+                # Counting rows loads the tables, so that is only done when profiling.
+                if profiling.enabled():
+                    span_args["rows_in"] = {t: len(data.table(t)) for t in sorted(module.used_tables())}
+
+                if module.chunked and not self.chunks_done:
+                    data.reviews = module.run_chunk(data.city, data.reviews)
+
+                module.run(data, self.shared_data)
+
+                if profiling.enabled():
+                    span_args["rows_out"] = {t: len(data.table(t)) for t in span_args["rows_in"] if data.is_loaded(t)}
+        except KeyError as e:
+            column = e.args[0] if e.args else None
+            for table in module.used_tables() | set(before):
+                if column in self.spilled.get(table, set()):
+                    raise KeyError(
+                        f"{self.log_tag}: ERROR: Module '{name}' used column '{column}' of {table}, "
+                        f"which is only available to run_chunk when processing in chunks."
+                    ) from e
+                if (
+                    isinstance(column, str)
+                    and column in data.available_columns(table)
+                    and column not in data.columns.get(table, [])
+                ):
+                    raise KeyError(
+                        f"{self.log_tag}: ERROR: Module '{name}' used column '{column}' of "
+                        f"{table}, which no module declares in 'reads'."
+                    ) from e
+            raise
+
+        for table, columns in module.writes.items():
+            missing = [c for c in columns if c not in data.table(table).columns and c not in self.spilled.get(table, set())]
+            assert not missing, f"{self.log_tag}: ERROR: Module '{name}' declares writing {missing} to {table}, but did not."
+
+        for table, columns in before.items():
+            if not data.is_loaded(table):
+                continue
+
+            added = set(data.table(table).columns) - columns - set(data.available_columns(table))
+            undeclared = sorted(added - set(module.writes.get(table, [])))
+            assert not undeclared, f"{self.log_tag}: ERROR: Module '{name}' wrote {undeclared} to {table} without declaring them in 'writes'."
+
+        missing = [key for key in module.produces if key not in self.shared_data]
+        assert not missing, f"{self.log_tag}: ERROR: Module '{name}' declares producing {missing} in shared_data, but did not."
+
+
+# The (table, column) pairs a module reads and writes. shared_data keys count as
+# columns of a "shared_data" table, and a None column stands for the whole table.
+def module_accesses(module: BaseModule) -> Tuple[Set[Tuple[str, Any]], Set[Tuple[str, Any]]]:
+    reads = {(t, c) for t, columns in module.reads.items() for c in (columns or [None])}
+    reads |= {("shared_data", key) for key in module.consumes}
+
+    writes = {(t, c) for t, columns in module.writes.items() for c in columns}
+    writes |= {("shared_data", key) for key in module.produces}
+
+    return reads, writes
+
+
+def overlaps(a: Set[Tuple[str, Any]], b: Set[Tuple[str, Any]]) -> bool:
+    return any(
+        table == other_table and (col == other_col or col is None or other_col is None)
+        for table, col in a
+        for other_table, other_col in b
+    )
+
+
+# Identifies the snapshot data was loaded from, if it was loaded from the download cache.
+def data_version(data: Data):
+    return data.source.snapshot_version() if data.source is not None else None
+
+
+# The module classes needed to run the named ones: those, and every module before
+# them writing something they read, recursively. Keeps the order of module_classes.
+def module_closure(module_classes: list, names: List[str]) -> list:
+    accesses = [module_accesses(c) for c in module_classes]
+    needed = {i for i, c in enumerate(module_classes) if c.__name__ in names}
+
+    # Modules only depend on earlier ones, so one pass from the back finds them all.
+    for j in reversed(range(len(module_classes))):
+        if j in needed:
+            reads = accesses[j][0]
+            needed |= {i for i in range(j) if overlaps(accesses[i][1], reads)}
+
+    return [c for i, c in enumerate(module_classes) if i in needed]
@@ -1,5 +1,7 @@
 import os
 
+import profiling
+
 
 def plot_path(city: str, name: str) -> str:
     # This is run from src
@@ -8,7 +10,13 @@ def plot_path(city: str, name: str) -> str:
     if "." not in path:
         path += ".svg"
 
-    if not os.path.exists(os.path.dirname(path)):
-        os.makedirs(os.path.dirname(path))
+    # Plot modules running at the same time may create the directory together.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
 
     return path
+
+
+# Saves a figure to a path from plot_path, timed as a span of the run's profile.
+def save_plot(figure, path: str):
+    with profiling.span(f"save {os.path.basename(path)}", "plot"):
+        figure.savefig(path)
@@ -0,0 +1,170 @@
+import cProfile
+import json
+import os
+import pstats
+import resource
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+log_tag = "[Profiler]"
+
+# The profiler of the city being run. Spans are only recorded while it is set,
+# so the spans in the rest of the code cost next to nothing when profiling is off.
+active: Optional["Profiler"] = None
+
+
+# Records spans (named, nested sections of a run) with their wall time, CPU
+# time and peak RSS growth, and writes them as a JSON report and as a trace that
+# can be opened in chrome://tracing or https://ui.perfetto.dev.
+class Profiler:
+    def __init__(self, city: str, cprofile_stage: Optional[str] = None):
+        self.city = city
+        self.cprofile_stage = cprofile_stage
+
+        # This is run from src
+        self.directory = f"../profiles/{city}"
+
+        self.start = time.perf_counter()
+        self.spans = []
+        self.stack = []
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+        report = {
+            "city": self.city,
+            "wall_seconds": time.perf_counter() - self.start,
+            "spans": sorted(self.spans, key=lambda s: s["start"]),
+        }
+        with open(f"{self.directory}/report.json", "wt") as f:
+            json.dump(report, f, indent=2, default=str)
+
+        trace = {"traceEvents": [trace_event(s) for s in report["spans"]], "displayTimeUnit": "ms"}
+        with open(f"{self.directory}/trace.json", "wt") as f:
+            json.dump(trace, f, default=str)
+
+        print(f"{log_tag}: Wrote {len(self.spans)} spans to '{self.directory}'.")
+
+    def print_summary(self):
+        print(f"{log_tag}: Modules of '{self.city}'")
+        print(f"{'module':<25}{'wall (s)':>10}{'cpu (s)':>10}{'peak rss (MB)':>15}  rows in -> out")
+
+        for s in sorted(self.spans, key=lambda s: s["start"]):
+            if s["category"] != "module":
+                continue
+
+            rows = ", ".join(
+                f"{t} {s['args']['rows_in'].get(t)} -> {s['args']['rows_out'].get(t)}"
+                for t in s["args"].get("rows_in", {})
+            )
+            print(
+                f"{s['name']:<25}{s['wall_seconds']:>10.2f}{s['cpu_seconds']:>10.2f}"
+                f"{s['max_rss_delta_mb']:>15.1f}  {rows}"
+            )
+
+
+def start(city: str, cprofile_stage: Optional[str] = None) -> Profiler:
+    global active
+
+    active = Profiler(city, cprofile_stage)
+    return active
+
+
+def stop():
+    global active
+
+    if active is not None:
+        active.write()
+        active.print_summary()
+
+    active = None
+
+
+def enabled() -> bool:
+    return active is not None
+
+
+# The spans recorded so far, used to hand the spans of forked processes back to the parent.
+def recorded() -> list:
+    return active.spans if active is not None else []
+
+
+def add(spans: list):
+    if active is not None:
+        active.spans.extend(spans)
+
+
+# Times the body as a span. Yields the span's args, so values only known at
+# the end (like the rows a module produced) can be added to it.
+@contextmanager
+def span(name: str, category: str = "span", **args):
+    profiler = active
+    if profiler is None:
+        yield args
+        return
+
+    parent = "/".join(profiler.stack) or None
+    profiler.stack.append(name)
+
+    start_time = time.perf_counter()
+    start_cpu = time.process_time()
+    start_rss = max_rss_mb()
+
+    try:
+        yield args
+    finally:
+        profiler.stack.pop()
+        profiler.spans.append({
+            "name": name,
+            "category": category,
+            "parent": parent,
+            "pid": os.getpid(),
+            "start": start_time - profiler.start,
+            "wall_seconds": time.perf_counter() - start_time,
+            "cpu_seconds": time.process_time() - start_cpu,
+            "max_rss_delta_mb": max_rss_mb() - start_rss,
+            "args": args,
+        })
+
+
+# Runs the body under cProfile if name is the configured stage, and saves the
+# stats next to the report. They can be read with pstats or snakeviz.
+@contextmanager
+def cprofile(name: str):
+    if active is None or active.cprofile_stage != name:
+        yield
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+
+    try:
+        yield
+    finally:
+        profile.disable()
+
+        os.makedirs(active.directory, exist_ok=True)
+        path = f"{active.directory}/{name}.prof"
+        profile.dump_stats(path)
+
+        print(f"{log_tag}: Saved cProfile stats of '{name}' to '{path}'. Top functions:")
+        pstats.Stats(profile).sort_stats("cumulative").print_stats(15)
+
+
+# The peak resident set size of the process so far. ru_maxrss is in kilobytes on Linux.
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def trace_event(s: dict) -> dict:
+    return {
+        "name": s["name"],
+        "cat": s["category"],
+        "ph": "X",
+        "ts": s["start"] * 1e6,
+        "dur": s["wall_seconds"] * 1e6,
+        "pid": s["pid"],
+        "tid": s["pid"],
+        "args": {"cpu_seconds": s["cpu_seconds"], "max_rss_delta_mb": s["max_rss_delta_mb"], **s["args"]},
+    }
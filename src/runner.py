@@ -0,0 +1,74 @@
+import random
+import time
+from typing import Dict, List
+
+from checkpoint import Checkpoint
+from config import Config
+from data_loader import DataLoader
+from pipeline import Pipeline, module_closure
+
+import modules
+import profiling
+from modules.base_module import BaseModule
+
+
+MODULES = [
+    modules.PrintData,
+    modules.LanguageDetection,
+    modules.ReviewCleaning,
+    modules.StayDurations,
+    modules.CalculateVacancy,
+    modules.ReviewSentiments,
+    modules.SentimentPlots,
+    modules.StaleListings,
+    modules.StaleListingPlots,
+    modules.ListingInfoPlots,
+    # Add modules to run in sequence. Modules that do not depend on each other
+    # run at the same time when pipeline_workers is above 1.
+    # To add a new module just copy the PrintData module and modify the "run" function.
+]
+
+
+# Creates the modules of cfg.stages and the modules they depend on, or all modules
+# if no stages are given. Modules that are not needed are not created, so their
+# models are not loaded. Without cfg.plots, modules only making plots are left out
+# and the others skip their plots.
+def create_modules(cfg: Config) -> List[BaseModule]:
+    classes = MODULES if cfg.stages is None else module_closure(MODULES, cfg.stages)
+
+    if not cfg.plots:
+        classes = [c for c in classes if not c.plot_only]
+
+    pipeline_modules = [c() for c in classes]
+    for module in pipeline_modules:
+        module.plots = cfg.plots
+
+    return pipeline_modules
+
+
+# Runs the pipeline for cfg.city. The modules can be reused between cities.
+# Returns the time spent loading data and running the pipeline.
+def run_city(cfg: Config, pipeline_modules: List[BaseModule]) -> Dict[str, float]:
+    # Same seed for every city, so results do not depend on the order cities are run in.
+    random.seed(1337)
+
+    if cfg.profile:
+        profiling.start(cfg.city, cfg.profile_stage)
+
+    # Stopped even when the city fails, so a batch worker does not go on recording
+    # the next city into its profile.
+    try:
+        start = time.perf_counter()
+        with profiling.span("load", "io"):
+            data = DataLoader(cfg).load()
+        loaded = time.perf_counter()
+
+        with profiling.span("pipeline"):
+            checkpoint = Checkpoint(cfg) if cfg.checkpoints else None
+            Pipeline(pipeline_modules, cfg.pipeline_workers, checkpoint, cfg.chunk_size).run(data, resume=cfg.resume)
+        done = time.perf_counter()
+    finally:
+        if cfg.profile:
+            profiling.stop()
+
+    return {"load": loaded - start, "pipeline": done - loaded}
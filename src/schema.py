@@ -0,0 +1,128 @@
+import pandas as pd
+
+# Declared column types for the InsideAirbnb tables.
+#
+# Columns that are not listed here are kept as plain strings. Listed columns
+# that are missing from a snapshot are skipped, as the InsideAirbnb schema
+# differs a bit between cities and snapshots.
+#
+# Kinds:
+#   int      - whole numbers (nullable if the column has missing values)
+#   float    - numbers
+#   price    - "$1,234.00" style strings parsed to float
+#   percent  - "95%" style strings parsed to float (0-100)
+#   date     - datetime64
+#   bool     - "t"/"f" flags parsed to bool
+#   category - low-cardinality strings, stored as categoricals in memory
+TABLE_SCHEMAS = {
+    "listings": {
+        "id": "int",
+        "host_id": "int",
+        "host_response_time": "category",
+        "host_response_rate": "percent",
+        "host_acceptance_rate": "percent",
+        "host_is_superhost": "category",
+        "host_listings_count": "float",
+        "host_total_listings_count": "float",
+        "host_has_profile_pic": "category",
+        "host_identity_verified": "category",
+        "neighbourhood_cleansed": "category",
+        "neighbourhood_group_cleansed": "category",
+        "latitude": "float",
+        "longitude": "float",
+        "property_type": "category",
+        "room_type": "category",
+        "accommodates": "float",
+        "bathrooms": "float",
+        "bedrooms": "float",
+        "beds": "float",
+        "price": "price",
+        "minimum_nights": "float",
+        "maximum_nights": "float",
+        "has_availability": "category",
+        "availability_30": "float",
+        "availability_60": "float",
+        "availability_90": "float",
+        "availability_365": "float",
+        "number_of_reviews": "float",
+        "number_of_reviews_ltm": "float",
+        "number_of_reviews_l30d": "float",
+        "first_review": "date",
+        "last_review": "date",
+        "review_scores_rating": "float",
+        "review_scores_accuracy": "float",
+        "review_scores_cleanliness": "float",
+        "review_scores_checkin": "float",
+        "review_scores_communication": "float",
+        "review_scores_location": "float",
+        "review_scores_value": "float",
+        "instant_bookable": "category",
+        "calculated_host_listings_count": "float",
+        "reviews_per_month": "float",
+    },
+    "calendars": {
+        "listing_id": "int",
+        "date": "date",
+        "available": "bool",
+        "price": "price",
+        "adjusted_price": "price",
+        "minimum_nights": "float",
+        "maximum_nights": "float",
+    },
+    "reviews": {
+        "listing_id": "int",
+        "id": "int",
+        "date": "date",
+        "reviewer_id": "int",
+    },
+}
+
+
+def category_columns(table: str):
+    return [c for c, kind in TABLE_SCHEMAS[table].items() if kind == "category"]
+
+
+# Converts the raw (string) columns of a table to their declared types.
+# Categoricals are left as strings here, they are applied when reading from the cache.
+def apply_schema(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    for col, kind in TABLE_SCHEMAS[table].items():
+        if col not in df.columns:
+            continue
+
+        df[col] = convert_column(df[col], kind)
+
+    return df
+
+
+def convert_column(s: pd.Series, kind: str) -> pd.Series:
+    if kind == "int":
+        try:
+            # Fast path, most id columns are complete.
+            return s.astype("int64")
+        except (ValueError, TypeError):
+            return pd.to_numeric(s, errors="coerce").astype("Int64")
+
+    if kind == "float":
+        try:
+            return s.astype("float64")
+        except (ValueError, TypeError):
+            return pd.to_numeric(s, errors="coerce").astype("float64")
+
+    if kind in ("price", "percent"):
+        if pd.api.types.is_numeric_dtype(s):
+            return s.astype("float64")
+        s = s.astype(str).str.replace(r"[$,%]", "", regex=True)
+        return pd.to_numeric(s, errors="coerce").astype("float64")
+
+    if kind == "date":
+        return pd.to_datetime(s, errors="coerce")
+
+    if kind == "bool":
+        if pd.api.types.is_bool_dtype(s):
+            return s
+        return s.astype(str).str.lower() == "t"
+
+    if kind == "category":
+        return s
+
+    raise ValueError(f"Unknown column kind '{kind}'.")
@@ -1,10 +1,53 @@
+import os
+
 from config import Config
+import cache
+
+log_tag = "[Setup]"
+
+# Heavy dependencies (NLTK, spaCy, matplotlib) are imported by the stages
+# when they compute something, not at startup, so a cached run starts quickly.
+# use_nltk below imports NLTK on first use.
+
+# Folder NLTK resources are read from, set from the config in setup.
+nltk_data = "../nltk_data"
+
+# Processes the text stages split their work over, set from the config in setup.
+text_workers = 1
+ner_batch_size = 1000
+duration_fast_path = True
+language_detection = True
+
 
 def setup(config: Config):
-    from swifter import set_defaults
-    
-    # Set the swifter defaults.
-    # Swifter doc: https://github.com/jmcarpenter2/swifter/blob/master/docs/documentation.md
-    set_defaults(
-        allow_dask_on_strings=True,
-    )
\ No newline at end of file
+    global nltk_data, text_workers, ner_batch_size, duration_fast_path, language_detection
+
+    # Only compute stage results for reviews that were not seen before.
+    cache.incremental = config.incremental
+
+    nltk_data = config.nltk_data
+    text_workers = config.text_workers
+    ner_batch_size = config.ner_batch_size
+    duration_fast_path = config.duration_fast_path
+    language_detection = config.language_detection
+
+
+# Imports NLTK, reading resources only from nltk_data. Nothing is downloaded at
+# runtime, "make deps" downloads the resources.
+def use_nltk():
+    import nltk
+
+    path = os.path.abspath(nltk_data)
+    if nltk.data.path != [path]:
+        nltk.data.path[:] = [path]
+
+    return nltk
+
+
+# The path of an NLTK resource (like "corpora/stopwords/english"), for reading
+# it without importing NLTK.
+def nltk_resource(name: str) -> str:
+    path = os.path.join(nltk_data, name)
+    assert os.path.exists(path), f"{log_tag}: ERROR: NLTK resource '{name}' is not in '{nltk_data}'. Run 'make deps' to download it."
+
+    return path
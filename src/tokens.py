@@ -0,0 +1,133 @@
+from itertools import chain
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+# The words of the review texts, split on whitespace, as ids into a vocabulary
+# shared by the text stages instead of a string per word. The text stages look
+# up what they need per distinct word of the vocabulary (like its VADER valence),
+# once, and read it for every word of the reviews by its id.
+#
+# tokenize keeps the last stream it built, so the stages given the same texts
+# (like the distinct cleaned reviews of a chunk) split them once. The vocabulary
+# and that stream only last for the run of one city, see reset.
+
+
+class Vocabulary:
+    def __init__(self):
+        self.words: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+        # Values of the words, by the name given to lookup.
+        self.features: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    # The ids of words, adding the new ones.
+    def intern(self, words) -> np.ndarray:
+        ids = self.ids
+        for word in words:
+            if word not in ids:
+                ids[word] = len(self.words)
+                self.words.append(word)
+
+        return np.fromiter((ids[word] for word in words), dtype=np.int32, count=len(words))
+
+    # function(word) for every word of the vocabulary, indexed by id. The values are
+    # kept under name and only computed for the words added since, so name must
+    # always be given the same function.
+    def lookup(self, name: str, function: Callable[[str], object], dtype) -> np.ndarray:
+        values = self.features.get(name, np.zeros(0, dtype=dtype))
+
+        if len(values) < len(self.words):
+            new = self.words[len(values) :]
+            values = np.concatenate([values, np.fromiter(map(function, new), dtype=dtype, count=len(new))])
+            self.features[name] = values
+
+        return values
+
+
+# The words of texts: those of text i are ids[offsets[i] : offsets[i + 1]].
+class TokenStream:
+    def __init__(self, vocabulary: Vocabulary, ids: np.ndarray, offsets: np.ndarray):
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_texts(cls, texts, vocabulary: Vocabulary) -> "TokenStream":
+        words = [text.split() for text in texts]
+        lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+
+        # Interning only the distinct words, the rest are mapped by their codes.
+        codes, distinct = pd.factorize(np.fromiter(chain.from_iterable(words), dtype=object, count=lengths.sum()))
+        ids = vocabulary.intern(distinct)[codes] if len(codes) else np.zeros(0, dtype=np.int32)
+
+        return cls(vocabulary, ids, np.concatenate([[0], np.cumsum(lengths)]))
+
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    # The text of every word.
+    def texts(self) -> np.ndarray:
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+    # The stream of texts positions, in that order.
+    def take(self, positions: np.ndarray) -> "TokenStream":
+        positions = np.asarray(positions, dtype=np.int64)
+        lengths = self.lengths()[positions]
+
+        # The index of every word of the taken texts in ids.
+        starts = np.repeat(self.offsets[positions] - np.cumsum(lengths) + lengths, lengths)
+        words = starts + np.arange(lengths.sum())
+
+        return TokenStream(self.vocabulary, self.ids[words], np.concatenate([[0], np.cumsum(lengths)]))
+
+    # Adds up values per word (like a lookup of the vocabulary indexed by ids) per text.
+    def sum_per_text(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.texts(), weights=values, minlength=len(self))
+
+
+VOCABULARY = Vocabulary()
+
+# The distinct texts of the last tokenize call and their stream.
+last_texts: Optional[pd.Index] = None
+last_stream: Optional[TokenStream] = None
+
+
+# Starts an empty vocabulary and drops the last stream, so the words and texts of
+# one city are not kept for the next (batch workers run many cities).
+def reset():
+    global VOCABULARY, last_texts, last_stream
+
+    VOCABULARY = Vocabulary()
+    last_texts, last_stream = None, None
+
+
+# The token stream of texts (a Series or list of strings), in their order.
+def tokenize(texts) -> TokenStream:
+    global last_texts, last_stream
+
+    texts = pd.Index(texts, dtype=object)
+
+    if last_texts is not None:
+        positions = last_texts.get_indexer(texts)
+        if (positions >= 0).all():
+            return last_stream.take(positions)
+
+    with profiling.span("tokenize", "tokens") as args:
+        distinct = texts.unique()
+        stream = TokenStream.from_texts(distinct, VOCABULARY)
+
+        args["texts"] = len(distinct)
+        args["words"] = len(stream.ids)
+
+    last_texts, last_stream = distinct, stream
+    return stream.take(distinct.get_indexer(texts))